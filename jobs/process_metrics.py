@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 import os
-from datetime import datetime, timedelta, timezone
+from datetime import datetime, timezone
 from supabase import create_client, Client
 from dotenv import load_dotenv
 
@@ -13,35 +13,18 @@ supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 
 def main():
     now = datetime.now(timezone.utc)
-    five_min_ago = now - timedelta(minutes=5)
 
     print(f"[{now.isoformat()}] Running 5-minute job...")
 
-    # Ambil data 5 menit terakhir dari raw_metrics
-    data = (
-        supabase.table("raw_metrics")
-        .select("*")
-        .gte("ts_utc", five_min_ago.isoformat())
-        .execute()
-    ).data or []
+    # Agregasi 5 menit terakhir dijalankan langsung di database
+    # (lihat sql/process_metrics_5min.sql)
+    inserted = supabase.rpc("process_metrics_5min").execute().data or 0
 
-    if not data:
+    if not inserted:
         print("❗ No data found in last 5 minutes.")
         return
 
-    print(f"✅ Found {len(data)} new rows")
-
-    # Contoh agregasi sederhana per device
-    for row in data:
-        supabase.table("metrics_5min").insert({
-            "device_id": row["device_id"],
-            "ts_bucket": now.isoformat(),
-            "battery_level": row.get("battery_level"),
-            "net_type": row.get("net_type"),
-            "rssi": row.get("channel_quality"),
-            "is_charging": row.get("is_charging"),
-        }).execute()
-
+    print(f"✅ Aggregated {inserted} device rows")
     print("✅ Metrics processed and inserted successfully.")
 
 if __name__ == "__main__":
@@ -2,9 +2,19 @@
 Main file for smartphone battery health prediction thesis project
 """
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware 
 from typing import Dict
+from src.api.controller.pool import init_pool, close_pool
+from src.api.controller.db_controller import (
+    create_supabase_connection,
+    close_supabase_connection,
+    create_http_client,
+    warm_up_connections,
+)
+from src.api.controller.ingest_controller import start_ingest_worker, stop_ingest_worker
 from src.api.routes import (
     data_retrieval, 
     data_visualization, 
@@ -15,11 +25,30 @@ from src.api.routes import (
     impact_routes
 )
 
+# Define application lifespan
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Open and warm up shared resources on startup and release them on shutdown.
+    """
+    await init_pool()
+    app.state.supabase = create_supabase_connection()
+    app.state.http = create_http_client()
+    await warm_up_connections(app.state.supabase, app.state.http)
+    start_ingest_worker(app.state.http)
+    yield
+    await stop_ingest_worker(app.state.http)
+    await app.state.http.aclose()
+    close_supabase_connection()
+    await close_pool()
+
 # Define instances
 app = FastAPI(
     title="Smartphone Battery Health Prediction API",
     description="API for collecting and visualizing smartphone battery health data.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS middleware
@@ -40,6 +69,21 @@ app.include_router(prediction_visualization.router, prefix="/prediction", tags=[
 app.include_router(image_routes.router, prefix="/image-prediction", tags=["Image Prediction"])
 app.include_router(impact_routes.router, prefix="/impact", tags=["Impact Calculation"])
 
+# Fail fast if a route is registered twice in a router; only the first registration would ever be served
+for _module in (
+    data_retrieval,
+    data_visualization,
+    graphs_visualization,
+    battery_metrics,
+    prediction_visualization,
+    image_routes,
+    impact_routes,
+):
+    _registered = [(route.path, method) for route in _module.router.routes for method in sorted(route.methods)]
+    _duplicates = sorted({key for key in _registered if _registered.count(key) > 1})
+    if _duplicates:
+        raise RuntimeError(f"Duplicate route registrations in {_module.__name__}: {_duplicates}")
+
 # Define root endpoint
 @app.get("/", status_code=200)
 async def root() -> Dict[str, str]:
@@ -0,0 +1,105 @@
+-- Per-device monitoring summary served by GET /graphs/summary.
+-- Mirrors DataTransformation.compute_monitoring_summary(): energy and average
+-- throughput / BoT / energy-per-bit over the hour before the device's latest
+-- sample, plus energy since the start of that day.
+-- Refreshed every minute by pg_cron (see bottom of file).
+create materialized view if not exists device_summary as
+-- Latest sample per enrolled device: one backward index probe on
+-- raw_metrics_device_created_idx per device instead of aggregating the table
+with latest as (
+  select dv.device_id, l.created_at as window_end
+  from (select distinct device_id from devices) dv
+  cross join lateral (
+    select r.created_at
+    from raw_metrics r
+    where r.device_id = dv.device_id
+    order by r.created_at desc
+    limit 1
+  ) l
+),
+bounds as (
+  select
+    device_id,
+    window_end,
+    window_end - interval '1 hour' as window_start,
+    date_trunc('day', window_end) as day_start,
+    least(date_trunc('day', window_end), window_end - interval '1 hour') as scan_start
+  from latest
+),
+-- Samples in range plus the one just before it, so the first delta is defined
+samples as (
+  select r.device_id, r.created_at, r.tx_total_bytes, r.rx_total_bytes,
+         r.batt_voltage_mv, r.current_avg_ua
+  from raw_metrics r
+  join bounds b using (device_id)
+  where r.created_at >= b.scan_start and r.created_at <= b.window_end
+  union all
+  select p.*
+  from bounds b
+  cross join lateral (
+    select r.device_id, r.created_at, r.tx_total_bytes, r.rx_total_bytes,
+           r.batt_voltage_mv, r.current_avg_ua
+    from raw_metrics r
+    where r.device_id = b.device_id and r.created_at < b.scan_start
+    order by r.created_at desc
+    limit 1
+  ) p
+),
+deltas as (
+  select
+    device_id,
+    created_at,
+    batt_voltage_mv / 1000.0 as batt_voltage_v,
+    current_avg_ua / 1e6 as batt_current_a,
+    extract(epoch from created_at - lag(created_at) over w) as delta_t,
+    (tx_total_bytes - lag(tx_total_bytes) over w)
+      + (rx_total_bytes - lag(rx_total_bytes) over w) as delta_total_bytes
+  from samples
+  window w as (partition by device_id order by created_at)
+),
+metrics as (
+  select
+    d.device_id,
+    d.created_at,
+    d.batt_voltage_v,
+    d.batt_voltage_v * d.batt_current_a * d.delta_t / 3600.0 as energy_wh,
+    d.delta_total_bytes * 8 / nullif(d.delta_t, 0) as throughput_total_bps
+  from deltas d
+  where d.delta_t is not null
+),
+per_bit as (
+  select
+    m.*,
+    m.throughput_total_bps / 1e6 as throughput_total_mbps,
+    (((446.0 / nullif(m.throughput_total_bps, 0)) + 3.381132)
+      + ((357.5443 / nullif(m.throughput_total_bps, 0)) + 1.969068)) * 1e-9 / 2 as energy_per_bit_avg_J
+  from metrics m
+)
+select
+  b.device_id,
+  b.window_start,
+  b.window_end,
+  count(*) filter (where p.created_at > b.window_start) as sample_last,
+  coalesce(sum(p.energy_wh) filter (where p.created_at > b.window_start), 0)::float8 as energy_last_wh,
+  coalesce(avg(p.throughput_total_mbps) filter (where p.created_at > b.window_start), 'NaN')::float8 as avg_thr_last_mbps,
+  coalesce(
+    avg(p.energy_per_bit_avg_J) filter (where p.created_at > b.window_start)
+      * 8e9 / nullif(avg(p.batt_voltage_v), 0) * (1000.0 / 3600.0),
+    'NaN')::float8 as avg_bot_last,
+  coalesce(avg(p.energy_per_bit_avg_J) filter (where p.created_at > b.window_start), 'NaN')::float8 as avg_epb_last,
+  coalesce(sum(p.energy_wh) filter (where p.created_at >= b.day_start), 0)::float8 as energy_today_wh
+from bounds b
+join per_bit p using (device_id)
+where p.created_at >= b.scan_start
+group by b.device_id, b.window_start, b.window_end;
+
+-- Unique index required by refresh ... concurrently
+create unique index if not exists device_summary_device_idx
+  on device_summary (device_id);
+
+-- Refresh every minute without blocking readers
+select cron.schedule(
+  'refresh-device-summary',
+  '* * * * *',
+  'refresh materialized view concurrently device_summary'
+);
\ No newline at end of file
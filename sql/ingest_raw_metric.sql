@@ -0,0 +1,130 @@
+-- Idempotency key set by the API on every queued sample. Retried batch writes
+-- skip rows whose ingest_id is already stored. Rows without one never conflict.
+-- Run outside a transaction block (create index concurrently).
+alter table raw_metrics add column if not exists ingest_id uuid;
+alter table raw_metrics_5min add column if not exists ingest_id uuid;
+
+create unique index concurrently if not exists raw_metrics_ingest_id_idx
+  on raw_metrics (ingest_id);
+
+create unique index concurrently if not exists raw_metrics_5min_ingest_id_idx
+  on raw_metrics_5min (ingest_id);
+
+-- Ingest one smartphone sample: resolve user_id from devices and write the row
+-- to raw_metrics, and to raw_metrics_5min as well when mirror is true.
+-- Returns the stored payload including user_id.
+-- Called by the /raw-metrics route via POST /rest/v1/rpc/ingest_raw_metric.
+create or replace function ingest_raw_metric(payload jsonb, mirror boolean default false)
+returns jsonb
+language plpgsql
+as $$
+declare
+  rec jsonb := payload;
+  uid text;
+  tbl text;
+  cols text;
+  targets text[] := array['raw_metrics'];
+begin
+  select d.user_id::text into uid
+  from devices d
+  where d.device_id = payload->>'device_id'
+  limit 1;
+
+  if uid is not null then
+    rec := rec || jsonb_build_object('user_id', uid);
+  end if;
+
+  if mirror then
+    targets := targets || 'raw_metrics_5min';
+  end if;
+
+  -- Insert only the columns present in the payload so table defaults still apply
+  foreach tbl in array targets loop
+    select string_agg(quote_ident(c.column_name), ', ')
+    into cols
+    from information_schema.columns c
+    where c.table_schema = 'public'
+      and c.table_name = tbl
+      and rec ? c.column_name;
+
+    execute format(
+      'insert into %1$I (%2$s) select %2$s from jsonb_populate_record(null::%1$I, $1)',
+      tbl, cols
+    ) using rec;
+  end loop;
+
+  return rec;
+end;
+$$;
+
+-- Batched variant used by the in-process ingest queue: payloads is a jsonb
+-- array of samples. The API attaches user IDs it already resolved as
+-- cached_user_id; other samples look up user_id per device, keeping the
+-- sample's own user_id when the device is unknown. Inserts samples with one
+-- statement per target table and distinct key set, and returns the stored rows
+-- as a jsonb array.
+-- Samples whose ingest_id is already stored are skipped, so retries are safe.
+create or replace function ingest_raw_metrics(payloads jsonb, mirror boolean default false)
+returns jsonb
+language plpgsql
+as $$
+declare
+  recs jsonb;
+  grp jsonb;
+  keyset text[];
+  tbl text;
+  cols text;
+  targets text[] := array['raw_metrics'];
+begin
+  select coalesce(jsonb_agg(
+    case when coalesce(p.value->>'cached_user_id', d.user_id::text) is null then p.value - 'cached_user_id'
+         else (p.value - 'cached_user_id')
+           || jsonb_build_object('user_id', coalesce(p.value->>'cached_user_id', d.user_id::text)) end
+    order by p.ordinality), '[]'::jsonb)
+  into recs
+  from jsonb_array_elements(payloads) with ordinality as p(value, ordinality)
+  left join lateral (
+    select dv.user_id
+    from devices dv
+    where not (p.value ? 'cached_user_id')
+      and dv.device_id = p.value->>'device_id'
+    limit 1
+  ) d on true;
+
+  if jsonb_array_length(recs) = 0 then
+    return recs;
+  end if;
+
+  if mirror then
+    targets := targets || 'raw_metrics_5min';
+  end if;
+
+  -- Insert each distinct key set with its own column list, so keys a sample
+  -- omits keep their column defaults instead of an explicit null
+  for keyset, grp in
+    select k.keys, jsonb_agg(r.value order by r.ordinality)
+    from jsonb_array_elements(recs) with ordinality as r(value, ordinality)
+    cross join lateral (
+      select array_agg(key order by key) as keys from jsonb_object_keys(r.value) as key
+    ) k
+    group by k.keys
+  loop
+    foreach tbl in array targets loop
+      select string_agg(quote_ident(c.column_name), ', ')
+      into cols
+      from information_schema.columns c
+      where c.table_schema = 'public'
+        and c.table_name = tbl
+        and c.column_name::text = any(keyset);
+
+      execute format(
+        'insert into %1$I (%2$s) select %2$s from jsonb_populate_recordset(null::%1$I, $1) '
+        'on conflict (ingest_id) do nothing',
+        tbl, cols
+      ) using grp;
+    end loop;
+  end loop;
+
+  return recs;
+end;
+$$;
\ No newline at end of file
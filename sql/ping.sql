@@ -0,0 +1,9 @@
+-- Cheap round trip used by the API lifespan to open the PostgREST keep-alive
+-- connections before the first real request.
+create or replace function ping()
+returns integer
+language sql
+stable
+as $$
+  select 1;
+$$;
\ No newline at end of file
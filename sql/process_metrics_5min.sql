@@ -0,0 +1,25 @@
+-- Aggregate the last 5 minutes of raw_metrics into metrics_5min (one row per device).
+-- Called by jobs/process_metrics.py via supabase.rpc("process_metrics_5min").
+create or replace function process_metrics_5min()
+returns integer
+language plpgsql
+as $$
+declare
+  inserted integer;
+begin
+  insert into metrics_5min (device_id, ts_bucket, battery_level, net_type, rssi, is_charging)
+  select
+    device_id,
+    date_trunc('minute', now()) as ts_bucket,
+    round(avg(battery_level))::int as battery_level,
+    (array_agg(net_type order by ts_utc desc))[1] as net_type,
+    avg(channel_quality) as rssi,
+    (array_agg(is_charging order by ts_utc desc))[1] as is_charging
+  from raw_metrics
+  where ts_utc >= now() - interval '5 minutes'
+  group by device_id;
+
+  get diagnostics inserted = row_count;
+  return inserted;
+end;
+$$;
@@ -0,0 +1,17 @@
+-- Indexes backing the per-device reads done by the API.
+-- Every read filters by device_id and orders by created_at or ts_utc with a
+-- LIMIT; a btree on (device_id, ts) serves both ASC and DESC (backward scan),
+-- so these turn "Seq Scan + Sort" into an index scan that stops at LIMIT.
+-- Run outside a transaction block (create index concurrently)
+create index concurrently if not exists raw_metrics_device_created_idx
+  on raw_metrics (device_id, created_at);
+
+create index concurrently if not exists raw_metrics_device_ts_idx
+  on raw_metrics (device_id, ts_utc desc);
+
+create index concurrently if not exists raw_metrics_5min_device_ts_idx
+  on raw_metrics_5min (device_id, ts_utc desc);
+
+-- Check the /raw-metrics latest-rows query now uses raw_metrics_device_ts_idx:
+-- explain analyze
+--   select * from raw_metrics where device_id = '<device_id>' order by ts_utc desc limit 2;
\ No newline at end of file
@@ -4,24 +4,106 @@ Database controller module for handling database operations.
 
 import os
 import sys
+import asyncio
+import threading
+import httpx
 
-from supabase import create_client, Client
+from supabase import create_client, Client, ClientOptions
 from src.exception.exception import CustomException
+from src.logging.logging import logging
 from dotenv import load_dotenv
 load_dotenv()
 
+# Shared Supabase client and its keep-alive HTTP session, created once per process
+_SUPABASE: Client | None = None
+_SUPABASE_SESSION: httpx.Client | None = None
+_SUPABASE_LOCK = threading.Lock()
+
 # Define function to create connection to supabase
 def create_supabase_connection() -> Client:
   '''
-  Function to create connection to Supabase database\n
+  Function to create connection to Supabase database.
+  The client is created on first call and reused afterwards.\n
   returns: 
     - Supabase client instance
   '''
+  global _SUPABASE, _SUPABASE_SESSION
+  try:
+    if _SUPABASE is None:
+      with _SUPABASE_LOCK:
+        if _SUPABASE is None:
+          # Keep-alive session shared by the PostgREST calls of every route
+          _SUPABASE_SESSION = httpx.Client(
+            timeout=10.0,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32, keepalive_expiry=60),
+          )
+          _SUPABASE = create_client(
+            os.getenv("SUPABASE_API_URL"),
+            os.getenv("SUPABASE_API_KEY"),
+            options=ClientOptions(httpx_client=_SUPABASE_SESSION),
+          )
+    return _SUPABASE
+  except Exception as e:
+    raise CustomException(e, sys)
+
+# Define function to close the shared Supabase session
+def close_supabase_connection() -> None:
+  '''
+  Function to close the keep-alive session of the shared Supabase client on shutdown.
+  '''
+  global _SUPABASE, _SUPABASE_SESSION
+  with _SUPABASE_LOCK:
+    if _SUPABASE_SESSION is not None:
+      _SUPABASE_SESSION.close()
+    _SUPABASE = None
+    _SUPABASE_SESSION = None
+
+# Define FastAPI dependency returning the shared Supabase client
+def get_supabase() -> Client:
+  '''
+  Function to provide the process-wide Supabase client to route handlers.\n
+  returns:
+    - Supabase client instance
+  '''
+  return create_supabase_connection()
+
+# Define function to create a shared HTTP client for the Supabase REST API
+def create_http_client() -> httpx.AsyncClient:
+  '''
+  Function to create an async HTTP client bound to the Supabase REST endpoint.
+  Created once at application startup and closed on shutdown.\n
+  returns:
+    - httpx AsyncClient instance
+  '''
   try:
-    supabase: Client = create_client(
-      os.getenv("SUPABASE_API_URL"),
-      os.getenv("SUPABASE_API_KEY")
+    api_key = os.getenv("SUPABASE_API_KEY") or ""
+    return httpx.AsyncClient(
+      base_url=os.getenv("SUPABASE_API_URL") or "",
+      headers={
+        "apikey": api_key,
+        "Authorization": f"Bearer {api_key}",
+        "Prefer": "return=minimal",
+      },
+      timeout=10.0,
+      limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
     )
-    return supabase
   except Exception as e:
-    raise CustomException(e, sys)
\ No newline at end of file
+    raise CustomException(e, sys)
+
+# Define function to warm up the database connections
+async def warm_up_connections(supabase: Client, http: httpx.AsyncClient) -> None:
+  '''
+  Function to run a cheap ping through the Supabase client and the async HTTP client on startup,
+  so TLS handshakes and PostgREST schema loading are not paid by the first request.
+  Failures are logged and do not stop the application.\n
+  params:
+  - supabase: Shared Supabase client.
+  - http: Shared async HTTP client bound to the Supabase REST endpoint.
+  '''
+  try:
+    await asyncio.to_thread(lambda: supabase.rpc("ping").execute())
+    response = await http.post("/rest/v1/rpc/ping", json={})
+    response.raise_for_status()
+    logging.info("Supabase connections warmed up.")
+  except Exception as e:
+    logging.warning(f"Supabase warm-up failed: {e}")
\ No newline at end of file
@@ -0,0 +1,37 @@
+'''
+ETag controller module for conditional GET responses.
+'''
+
+import hashlib
+
+from fastapi import Request
+
+# Define function to build a strong ETag
+def build_etag(*parts) -> str:
+  '''
+  Function to build a strong ETag from the values identifying a response.\n
+  params:
+  - parts: Values such as device id, latest timestamp and row count.\n
+  returns:
+  - Quoted ETag string.
+  '''
+  digest = hashlib.blake2b("|".join(str(p) for p in parts).encode(), digest_size=16).hexdigest()
+  return f'"{digest}"'
+
+# Define function to check If-None-Match
+def etag_matches(request: Request, etag: str) -> bool:
+  '''
+  Function to check whether the client already holds the given ETag.\n
+  params:
+  - request: Incoming request.
+  - etag: Current ETag of the resource.\n
+  returns:
+  - True if If-None-Match contains the ETag.
+  '''
+  header = request.headers.get("if-none-match")
+  if not header:
+    return False
+  if header.strip() == "*":
+    return True
+  candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+  return etag in candidates
\ No newline at end of file
@@ -5,13 +5,12 @@ and returning prediction results.
 '''
 
 import sys
-from io import BytesIO
 from typing import Any
 
 from fastapi import UploadFile, File, HTTPException
 from PIL import Image
 
-from src.service.image_inference import predict_damage
+from src.service.image_inference import predict_damage, IMG_H, IMG_W
 from src.logging.logging import logging
 from src.exception.exception import CustomException
 from src.api.model.prediction_model import ImagePredictionResponse
@@ -30,12 +29,16 @@ async def run_image_prediction(file: UploadFile = File(..., description="Image f
     if file.content_type is None:
       raise HTTPException(status_code=400, detail="Invalid file type. Please upload an image file.")
     
-    data = await file.read()
-    if not data:
+    # Check for empty upload without reading the whole file into memory
+    if file.size == 0 or (file.size is None and not file.file.read(1)):
       raise HTTPException(status_code=400, detail="Empty file uploaded. Please provide a valid image file.")
+    await file.seek(0)
     
+    # Decode straight from the spooled upload, letting JPEG decode at reduced size
     try:
-      image = Image.open(BytesIO(data))
+      image = Image.open(file.file)
+      image.draft("RGB", (IMG_W, IMG_H))
+      image.load()
     except Exception:
       raise HTTPException(status_code=400, detail="Unable to open image. Please ensure the file is a valid image format.")
     
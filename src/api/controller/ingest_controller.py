@@ -0,0 +1,317 @@
+'''
+Ingest queue module for buffering smartphone samples.
+Samples are queued by the POST handler and written to raw_metrics in batches
+by a background worker started in the FastAPI lifespan.
+'''
+
+import sys
+import json
+import uuid
+import asyncio
+import asyncpg
+import httpx
+
+from typing import List, Dict, Any, Tuple
+from cachetools import TTLCache
+from src.api.controller.pool import get_pool
+from src.api.controller.response_cache import invalidate_devices
+from src.exception.exception import CustomException
+from src.logging.logging import logging
+
+# Define batching constants
+INGEST_BATCH_ROWS = 500
+INGEST_FLUSH_S = 1.0
+INGEST_QUEUE_SIZE = 50_000
+
+# Retry settings for batch writes
+WRITE_RETRIES = 3
+WRITE_BACKOFF_S = 0.5
+
+# Device -> user_id mapping learned from stored rows; devices rarely re-enroll
+DEVICE_USER_CACHE: TTLCache = TTLCache(maxsize=100_000, ttl=3600)
+
+# Payload key carrying a cached user_id to ingest_raw_metrics, which strips it
+CACHED_USER_KEY = "cached_user_id"
+
+# SQLSTATE classes for data exceptions and integrity violations, which retrying cannot fix
+REJECTED_SQLSTATE_CLASSES = ("22", "23")
+
+# Shared queue and worker, created in the FastAPI lifespan
+_INGEST_QUEUE: asyncio.Queue | None = None
+_INGEST_WORKER: asyncio.Task | None = None
+
+# Define error for batches the database refuses because of their data
+class BatchRejectedError(Exception):
+  '''
+  Raised when the database rejects a batch because of a value in it, so retrying the same batch cannot succeed.
+  '''
+
+# Define function to post a JSON body with retry
+async def _post_with_retry(
+  http: httpx.AsyncClient, path: str, body: Any,
+  params: Dict[str, str] | None = None, headers: Dict[str, str] | None = None) -> httpx.Response | None:
+  '''
+  Function to POST to the Supabase REST endpoint, retrying transient failures with backoff.\n
+  params:
+  - http: Shared HTTP client bound to the Supabase REST endpoint.
+  - path: REST path to post to.
+  - body: JSON body.
+  - params: Optional query parameters.
+  - headers: Optional extra request headers.\n
+  returns:
+  - Response on success, or None once all retries failed.\n
+  raises:
+  - BatchRejectedError when PostgREST rejects the body with a client error.
+  '''
+  for attempt in range(1, WRITE_RETRIES + 1):
+    try:
+      response = await http.post(path, json=body, params=params, headers=headers)
+      if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+        raise BatchRejectedError(f"{response.status_code} {response.text}")
+      response.raise_for_status()
+      return response
+    except BatchRejectedError:
+      raise
+    except Exception as e:
+      logging.error(f"Error posting to {path} (attempt {attempt}/{WRITE_RETRIES}): {e}")
+      if attempt < WRITE_RETRIES:
+        await asyncio.sleep(WRITE_BACKOFF_S * attempt)
+  return None
+
+# Define function to run the ingest RPC on the direct connection with retry
+async def _ingest_with_retry(pool: Any, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]] | None:
+  '''
+  Function to write a batch through ingest_raw_metrics on the asyncpg pool, retrying transient failures with backoff.\n
+  params:
+  - pool: Shared asyncpg pool.
+  - batch: Sample payloads with cached user IDs attached.\n
+  returns:
+  - Stored rows on success, or None once all retries failed.\n
+  raises:
+  - BatchRejectedError when the database rejects a value in the batch.
+  '''
+  for attempt in range(1, WRITE_RETRIES + 1):
+    try:
+      async with pool.acquire() as conn:
+        stored = await conn.fetchval("SELECT ingest_raw_metrics($1::jsonb, true)::text", json.dumps(batch))
+      return json.loads(stored) if stored else batch
+    except asyncpg.PostgresError as e:
+      if (getattr(e, "sqlstate", None) or "")[:2] in REJECTED_SQLSTATE_CLASSES:
+        raise BatchRejectedError(str(e)) from e
+      logging.error(f"Error ingesting through pool (attempt {attempt}/{WRITE_RETRIES}): {e}")
+    except Exception as e:
+      logging.error(f"Error ingesting through pool (attempt {attempt}/{WRITE_RETRIES}): {e}")
+    if attempt < WRITE_RETRIES:
+      await asyncio.sleep(WRITE_BACKOFF_S * attempt)
+  return None
+
+# Define function to attach cached user IDs
+def _attach_user_ids(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+  '''
+  Function to pass cached user IDs as cached_user_id so the database only looks up uncached devices.
+  A client-sent user_id is kept and still loses to the device mapping in the database.\n
+  params:
+  - batch: Queued sample payloads.\n
+  returns:
+  - Payloads with cached_user_id set for cached devices.
+  '''
+  attached = []
+  for payload in batch:
+    row = {key: value for key, value in payload.items() if key != CACHED_USER_KEY}
+    user_id = DEVICE_USER_CACHE.get(row.get("device_id"))
+    if user_id is not None:
+      row[CACHED_USER_KEY] = user_id
+    attached.append(row)
+  return attached
+
+# Define function to remember user IDs resolved by the database
+def _learn_user_ids(stored: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> None:
+  '''
+  Function to cache the device -> user_id pairs the database resolved for a batch.
+  Rows whose sample carried a user_id or a cached value teach nothing new.\n
+  params:
+  - stored: (sent payload, stored row) pairs returned by _write_isolating.
+  '''
+  for sent, row in stored:
+    if "user_id" in sent or CACHED_USER_KEY in sent:
+      continue
+    if row.get("device_id") is not None and row.get("user_id") is not None:
+      DEVICE_USER_CACHE[row["device_id"]] = row["user_id"]
+
+# Define function to record samples that could not be written
+def _dead_letter(batch: List[Dict[str, Any]], reason: str) -> None:
+  '''
+  Function to log every payload of a batch that could not be written, so no sample is lost silently.\n
+  params:
+  - batch: Payloads that were not written.
+  - reason: Why the write failed.
+  '''
+  logging.error(f"Dead-lettering {len(batch)} samples: {reason}")
+  for payload in batch:
+    logging.error(f"Dead-lettered sample: {json.dumps(payload, default=str)}")
+
+# Define function to write one batch through the pool or the REST RPC
+async def _write_batch(http: httpx.AsyncClient, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]] | None:
+  '''
+  Function to write a batch to raw_metrics and raw_metrics_5min, preferring the direct connection.\n
+  params:
+  - http: Shared HTTP client bound to the Supabase REST endpoint.
+  - batch: Payloads with cached user IDs attached.\n
+  returns:
+  - Stored rows in batch order, or None when the database stayed unreachable.\n
+  raises:
+  - BatchRejectedError when the database rejects a value in the batch.
+  '''
+  # Use the direct connection when available, falling back to the REST RPC when it keeps failing
+  pool = get_pool()
+  if pool is not None:
+    rows = await _ingest_with_retry(pool, batch)
+    if rows is not None:
+      return rows
+    logging.warning(f"Pool writes failed, retrying batch of {len(batch)} samples through REST.")
+  
+  # Resolve user_id and insert into raw_metrics in one RPC
+  response = await _post_with_retry(
+    http, "/rest/v1/rpc/ingest_raw_metrics", {"payloads": batch, "mirror": False},
+  )
+  if response is None:
+    return None
+  rows = response.json() or batch
+  
+  # Mirror to raw_metrics_5min, one insert per distinct key set so omitted keys keep their column defaults.
+  # ingest_id conflicts are ignored so a retried batch is not stored twice.
+  groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+  for row in rows:
+    groups.setdefault(tuple(sorted(row)), []).append(row)
+  for keys, group in groups.items():
+    try:
+      await _post_with_retry(
+        http, "/rest/v1/raw_metrics_5min", group,
+        params={"columns": ",".join(keys), "on_conflict": "ingest_id"},
+        headers={"Prefer": "resolution=ignore-duplicates"},
+      )
+    except BatchRejectedError as e:
+      logging.error(f"raw_metrics_5min rejected the mirror of {len(group)} stored samples: {e}")
+  return rows
+
+# Define function to write a batch, isolating rows the database rejects
+async def _write_isolating(http: httpx.AsyncClient, batch: List[Dict[str, Any]]) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+  '''
+  Function to write a batch, bisecting it on rejection so one bad sample cannot drop other devices' data.
+  Samples that still cannot be written are dead-lettered.\n
+  params:
+  - http: Shared HTTP client bound to the Supabase REST endpoint.
+  - batch: Payloads with cached user IDs attached.\n
+  returns:
+  - (sent payload, stored row) pairs of the written samples.
+  '''
+  try:
+    rows = await _write_batch(http, batch)
+  except BatchRejectedError as e:
+    if len(batch) == 1:
+      _dead_letter(batch, f"rejected by the database: {e}")
+      return []
+    mid = len(batch) // 2
+    return await _write_isolating(http, batch[:mid]) + await _write_isolating(http, batch[mid:])
+  if rows is None:
+    _dead_letter(batch, "database unreachable after retries")
+    return []
+  return list(zip(batch, rows))
+
+# Define function to write one batch
+async def _flush(http: httpx.AsyncClient, batch: List[Dict[str, Any]]) -> None:
+  '''
+  Function to write a batch of samples to raw_metrics and mirror it to raw_metrics_5min.\n
+  params:
+  - http: Shared HTTP client bound to the Supabase REST endpoint.
+  - batch: Queued sample payloads.
+  '''
+  try:
+    batch = _attach_user_ids(batch)
+    stored = await _write_isolating(http, batch)
+    _learn_user_ids(stored)
+    invalidate_devices(row.get("device_id") for _, row in stored)
+    logging.info(f"Ingested {len(stored)} of {len(batch)} samples.")
+  except Exception as e:
+    logging.error(f"Error flushing ingest batch: {CustomException(e, sys)}")
+    _dead_letter(batch, "unexpected error while flushing")
+
+# Define background worker draining the queue
+async def _run_worker(http: httpx.AsyncClient) -> None:
+  '''
+  Function to drain the ingest queue, flushing every INGEST_BATCH_ROWS samples or INGEST_FLUSH_S seconds.\n
+  params:
+  - http: Shared HTTP client bound to the Supabase REST endpoint.
+  '''
+  loop = asyncio.get_running_loop()
+  batch = []
+  try:
+    while True:
+      # Wait for the first sample, then collect until the batch is full or the window ends
+      batch = [await _INGEST_QUEUE.get()]
+      deadline = loop.time() + INGEST_FLUSH_S
+      while len(batch) < INGEST_BATCH_ROWS:
+        timeout = deadline - loop.time()
+        if timeout <= 0:
+          break
+        try:
+          batch.append(await asyncio.wait_for(_INGEST_QUEUE.get(), timeout))
+        except asyncio.TimeoutError:
+          break
+      # Hand the batch off before awaiting so a cancellation never flushes it twice
+      pending, batch = batch, []
+      await _flush(http, pending)
+  except asyncio.CancelledError:
+    # Write the batch still being collected before stopping
+    if batch:
+      await _flush(http, batch)
+    raise
+
+# Define function to start the worker
+def start_ingest_worker(http: httpx.AsyncClient) -> None:
+  '''
+  Function to create the ingest queue and start its background worker.\n
+  params:
+  - http: Shared HTTP client bound to the Supabase REST endpoint.
+  '''
+  global _INGEST_QUEUE, _INGEST_WORKER
+  _INGEST_QUEUE = asyncio.Queue(maxsize=INGEST_QUEUE_SIZE)
+  _INGEST_WORKER = asyncio.create_task(_run_worker(http))
+
+# Define function to stop the worker
+async def stop_ingest_worker(http: httpx.AsyncClient) -> None:
+  '''
+  Function to stop the background worker and flush any samples still queued.\n
+  params:
+  - http: Shared HTTP client bound to the Supabase REST endpoint.
+  '''
+  global _INGEST_QUEUE, _INGEST_WORKER
+  if _INGEST_WORKER is not None:
+    _INGEST_WORKER.cancel()
+    try:
+      await _INGEST_WORKER
+    except asyncio.CancelledError:
+      pass
+    _INGEST_WORKER = None
+  
+  # Flush what is left so a clean shutdown does not lose samples
+  if _INGEST_QUEUE is not None:
+    remaining = []
+    while not _INGEST_QUEUE.empty():
+      remaining.append(_INGEST_QUEUE.get_nowait())
+    for start in range(0, len(remaining), INGEST_BATCH_ROWS):
+      await _flush(http, remaining[start:start + INGEST_BATCH_ROWS])
+    _INGEST_QUEUE = None
+
+# Define function to queue one sample
+async def enqueue_raw_metric(payload: Dict[str, Any]) -> None:
+  '''
+  Function to queue a sample for the next batch write. Waits when the queue is full.\n
+  params:
+  - payload: Sample payload from the smartphone.
+  '''
+  if _INGEST_QUEUE is None:
+    raise RuntimeError("Ingest worker is not running!")
+  
+  # Tag the sample so retried batch writes skip rows that were already stored
+  await _INGEST_QUEUE.put({**payload, "ingest_id": str(uuid.uuid4())})
\ No newline at end of file
@@ -0,0 +1,171 @@
+'''
+Postgres connection pool module for direct SQL access.
+This module owns an asyncpg pool to the Supabase Postgres instance, used by
+hot read paths that would otherwise go through the PostgREST client.
+'''
+
+import os
+import sys
+import asyncpg
+import pandas as pd
+
+from typing import Any, List, Tuple
+
+from src.exception.exception import CustomException
+from src.logging.logging import logging
+from dotenv import load_dotenv
+load_dotenv()
+
+# Define direct database connection string (optional)
+DB_URL = os.getenv("SUPABASE_DB_URL")
+
+# Pool size per worker process, kept small by default for Supabase connection limits
+PG_POOL_MIN_SIZE = int(os.getenv("PG_POOL_MIN_SIZE", "2"))
+PG_POOL_MAX_SIZE = int(os.getenv("PG_POOL_MAX_SIZE", "10"))
+
+# Shared pool, created in the FastAPI lifespan
+_POOL: asyncpg.Pool | None = None
+
+# Define function to initialize the pool
+async def init_pool() -> asyncpg.Pool | None:
+  '''
+  Function to create the asyncpg connection pool.\n
+  returns:
+  - asyncpg pool instance, or None if SUPABASE_DB_URL is not set
+  '''
+  global _POOL
+  try:
+    if not DB_URL:
+      logging.info("SUPABASE_DB_URL is not set. Skipping asyncpg pool creation.")
+      return None
+    
+    # statement_cache_size=0 keeps the pool compatible with the Supabase pooler (pgbouncer)
+    _POOL = await asyncpg.create_pool(
+      dsn=DB_URL,
+      min_size=PG_POOL_MIN_SIZE,
+      max_size=PG_POOL_MAX_SIZE,
+      max_inactive_connection_lifetime=300,
+      statement_cache_size=0,
+    )
+    logging.info("asyncpg pool created successfully.")
+    
+    # Open the minimum connections now instead of on the first request
+    async with _POOL.acquire() as conn:
+      await conn.fetchval("SELECT 1")
+    return _POOL
+  except Exception as e:
+    raise CustomException(e, sys)
+
+# Define function to close the pool
+async def close_pool() -> None:
+  '''
+  Function to close the asyncpg connection pool.
+  '''
+  global _POOL
+  if _POOL is not None:
+    await _POOL.close()
+    _POOL = None
+
+# Define function to get the pool
+def get_pool() -> asyncpg.Pool | None:
+  '''
+  Function to return the shared asyncpg pool.\n
+  returns:
+  - asyncpg pool instance, or None if not initialized
+  '''
+  return _POOL
+
+# Comparison operators accepted in row filters, named like the PostgREST filters
+SQL_FILTER_OPS = {"eq": "=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+# Define function to quote a SQL identifier
+def quote_ident(name: str) -> str:
+  '''
+  Function to quote a table or column name for safe interpolation into SQL.
+  '''
+  return '"' + name.replace('"', '""') + '"'
+
+# Define function to fetch rows of a table for a device
+async def fetch_table_rows(
+  table_name: str, device_id: str | None = None, limit: int = 200,
+  order_by: str = "created_at", desc: bool = True, columns: List[str] | None = None,
+  filters: List[Tuple[str, str, Any]] | None = None) -> pd.DataFrame:
+  '''
+  Function to fetch rows from a table through the pool, optionally filtered by device.\n
+  params:
+  - table_name: Table to read from.
+  - device_id: Optional device ID to filter the data.
+  - limit: Maximum number of rows to fetch.
+  - order_by: Column used to order rows.
+  - desc: Whether to fetch latest rows first.
+  - columns: Optional list of columns to select; all columns when None.
+  - filters: Optional (column, op, value) row filters; op is a SQL_FILTER_OPS key or "not_null".\n
+  returns:
+  - DataFrame containing the extracted data.
+  '''
+  try:
+    direction = "DESC" if desc else "ASC"
+    projection = ", ".join(quote_ident(col) for col in columns) if columns else "*"
+    query = f"SELECT {projection} FROM {quote_ident(table_name)}"
+    args = []
+    conditions = []
+    if device_id:
+      args.append(device_id)
+      conditions.append(f"device_id = ${len(args)}")
+    for col, op, value in filters or []:
+      if op == "not_null":
+        conditions.append(f"{quote_ident(col)} IS NOT NULL")
+      else:
+        args.append(value)
+        conditions.append(f"{quote_ident(col)} {SQL_FILTER_OPS[op]} ${len(args)}")
+    if conditions:
+      query += " WHERE " + " AND ".join(conditions)
+    args.append(limit)
+    query += f" ORDER BY {quote_ident(order_by)} {direction} LIMIT ${len(args)}"
+    
+    async with _POOL.acquire() as conn:
+      rows = await conn.fetch(query, *args)
+    
+    # Build from value tuples; the record keys already give the column order
+    if not rows:
+      return pd.DataFrame(columns=columns)
+    return pd.DataFrame.from_records([tuple(row) for row in rows], columns=list(rows[0].keys()))
+  except Exception as e:
+    raise CustomException(e, sys)
+
+# Define function to fetch a cheap version marker of a table
+async def fetch_table_version(table_name: str, device_id: str | None = None, ts_col: str = "ts_utc") -> tuple:
+  '''
+  Function to fetch the latest timestamp and row count of a table through the pool.\n
+  params:
+  - table_name: Table to read from.
+  - device_id: Optional device ID to filter the data.
+  - ts_col: Timestamp column used as the version marker.\n
+  returns:
+  - Tuple of (latest timestamp, row count).
+  '''
+  try:
+    query = f"SELECT max({quote_ident(ts_col)}), count(*) FROM {quote_ident(table_name)}"
+    args = []
+    if device_id:
+      args.append(device_id)
+      query += " WHERE device_id = $1"
+    
+    async with _POOL.acquire() as conn:
+      row = await conn.fetchrow(query, *args)
+    return row[0], row[1]
+  except Exception as e:
+    raise CustomException(e, sys)
+
+# Define function to fetch raw metrics for a device
+async def fetch_raw_metrics(device_id: str, limit: int = 200, desc: bool = True) -> pd.DataFrame:
+  '''
+  Function to fetch raw metrics rows for a device through the pool, ordered by created_at.\n
+  params:
+  - device_id: Device ID to filter the data.
+  - limit: Maximum number of rows to fetch.
+  - desc: Whether to fetch latest rows first.\n
+  returns:
+  - DataFrame containing the extracted data.
+  '''
+  return await fetch_table_rows("raw_metrics", device_id=device_id, limit=limit, order_by="created_at", desc=desc)
\ No newline at end of file
@@ -7,67 +7,191 @@ import sys
 import numpy as np
 import json
 import pickle
+import joblib
 import math
+import threading
+import asyncio
 import pandas as pd
+import tensorflow as tf
 
+from src.config import get_config
 from src.logging.logging import logging
 from src.exception.exception import CustomException
 from src.pipeline.data_ingestion import DataIngestion
 from src.pipeline.data_transformation import DataTransformation
 from src.api.model.prediction_model import PredictionResponse
 from src.service.expiry_date_calculation import compute_expiry_date
+from src.tools.fingerprint import source_fingerprint
 
+from cachetools import TTLCache
 from tensorflow.keras.models import load_model
 from sklearn.metrics import mean_absolute_error, r2_score, mean_squared_error
-from typing import Dict, Any
-from dotenv import load_dotenv
+from sklearn.preprocessing import OneHotEncoder
+from typing import Dict, Any, List
 from datetime import datetime, timedelta
-
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-ENV_PATH = os.path.join(BASE_DIR, ".env")
-load_dotenv(dotenv_path=ENV_PATH)
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
 
 # Define model directory
-MODEL_DIR = os.getenv("MODEL_DIR")
+cfg = get_config()
+MODEL_DIR = cfg.model_dir
+LATEST_DIR = cfg.latest_model_dir
 
 # Define max rows to process
 MAX_ROWS = 500
 
-if not MODEL_DIR:
-    raise RuntimeError("MODEL_DIR is not set. Check your .env and ENV_PATH configuration.")
+# Rows fetched from the database, with headroom for rows dropped by NaN feature filtering
+FETCH_ROWS = MAX_ROWS * 4
 
-model_path = os.path.join(f"{MODEL_DIR}/latest", "model.keras")
-scaler_path = os.path.join(f"{MODEL_DIR}/latest", "scaler.pkl")
+# Max windows per inference call, larger inputs are split into batches
+INFER_BATCH = 4096
 
-if not os.path.exists(model_path):
-    raise RuntimeError(f"Model file not found at {model_path}")
+# Max devices predicted concurrently by the multi-device endpoint
+MAX_CONCURRENT_PREDICTIONS = 8
 
-if not os.path.exists(scaler_path):
-    raise RuntimeError(f"Scaler file not found at {scaler_path}")
+# Max devices accepted by one multi-device request
+MAX_BATCH_DEVICES = 50
+
+# Cache of prediction responses keyed by (device_id, last ts_utc, row count)
+PREDICTION_CACHE: TTLCache = TTLCache(maxsize=256, ttl=300)
+PREDICTION_CACHE_LOCK = threading.Lock()
+
+# Keep TF single-threaded per call so concurrent predictions do not oversubscribe cores
+tf.config.threading.set_intra_op_parallelism_threads(1)
+tf.config.threading.set_inter_op_parallelism_threads(1)
 
-# Load model
-model = load_model(model_path, compile=False)
+# Worker pool for running prediction pipelines off the event loop
+PREDICTION_EXECUTOR = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_PREDICTIONS, thread_name_prefix="prediction")
 
-# Open scaler
-with open(scaler_path, "rb") as file:
-  scaler = pickle.load(file=file)
+model_path = LATEST_DIR / "model.keras"
+scaler_path = LATEST_DIR / "scaler.pkl"
+config_path = LATEST_DIR / "config.json"
+bundle_path = LATEST_DIR / "bundle.joblib"
 
-# Open JSON file configuration
-config_path = os.path.join(f"{MODEL_DIR}/latest", "config.json")
-with open(config_path, "r") as file:
-  model_config = json.load(file)
+# Fingerprint of the source model files; derived artifacts built from other sources are ignored
+source_hash = source_fingerprint(LATEST_DIR)
+
+# Load the bundle built by src.tools.bundle_model when it matches the source files
+bundle = joblib.load(bundle_path) if bundle_path.exists() else None
+if bundle is not None and source_hash is not None and bundle.get("source_hash") != source_hash:
+  logging.warning(f"Ignoring stale {bundle_path}, re-run src.tools.bundle_model.")
+  bundle = None
+
+if bundle is not None:
+  model = tf.keras.models.model_from_json(bundle["arch"])
+  model.set_weights(bundle["weights"])
+  scaler = SimpleNamespace(mean_=bundle["scaler_mean"], scale_=bundle["scaler_scale"])
+  model_config = bundle["config"]
+else:
+  if not model_path.exists():
+    raise RuntimeError(f"Model file not found at {model_path}")
+  
+  if not scaler_path.exists():
+    raise RuntimeError(f"Scaler file not found at {scaler_path}")
+  
+  # Load model
+  model = load_model(str(model_path), compile=False)
+  
+  # Open scaler
+  with open(scaler_path, "rb") as file:
+    scaler = pickle.load(file=file)
+  
+  # Open JSON file configuration
+  with open(config_path, "r") as file:
+    model_config = json.load(file)
 
 # Feature and target columns
 win_size = model_config["window_size"]
 feature_cols = model_config["feature_cols"]
 target_col = model_config["target_col"]
 
+# Split features into numeric columns and one-hot foreground app columns
+app_cols = [c for c in feature_cols if c.startswith("app_")]
+numeric_cols = [c for c in feature_cols if not c.startswith("app_")]
+app_categories = [c[4:] for c in app_cols]
+
+# Load the pre-fit app encoder, or fit it on the known categories
+ohe = None
+ohe_path = LATEST_DIR / "ohe.pkl"
+if ohe_path.exists():
+  with open(ohe_path, "rb") as file:
+    ohe = pickle.load(file=file)
+  
+  # A stale ohe.pkl from an older config would silently misalign the app columns
+  if list(ohe.categories_[0]) != app_categories:
+    logging.warning("ohe.pkl categories do not match config.json, refitting the encoder")
+    ohe = None
+if ohe is None:
+  ohe = OneHotEncoder(categories=[app_categories], handle_unknown="ignore", sparse_output=False, dtype=np.float32)
+  ohe.fit(np.array(app_categories, dtype=object).reshape(-1, 1))
+
+# Column order of [numeric | one-hot] mapped back to feature_cols order
+encoded_cols = numeric_cols + app_cols
+feature_order = [encoded_cols.index(c) for c in feature_cols]
+if feature_order == list(range(len(feature_cols))):
+  feature_order = None
+
 # RUL configuration
 rul_config = model_config["rul_config"]
 k_global = model_config["rul_config"]["k_global"]
 soh_eol = model_config["rul_config"]["soh_eol"] 
 hours_per_cycle = model_config["rul_config"]["hours_per_cycle"]
 
+# Fuse the StandardScaler into the model graph as a Normalization layer.
+# variance=scale_**2 matches sklearn, which uses scale 1.0 for zero-variance features.
+normalizer = tf.keras.layers.Normalization(
+  axis=-1,
+  mean=np.asarray(scaler.mean_, dtype=np.float32),
+  variance=np.asarray(scaler.scale_, dtype=np.float32) ** 2
+)
+fused_model = tf.keras.Sequential([
+  tf.keras.Input(shape=(win_size, len(feature_cols))),
+  normalizer,
+  model
+])
+
+tflite_path = LATEST_DIR / "model_fp16.tflite"
+tflite_hash_path = LATEST_DIR / "model_fp16.hash"
+
+# Use the TFLite model only when it was built from the current source files
+use_tflite = tflite_path.exists() and (
+  source_hash is None or (tflite_hash_path.exists() and tflite_hash_path.read_text().strip() == source_hash)
+)
+if tflite_path.exists() and not use_tflite:
+  logging.warning(f"Ignoring stale {tflite_path}, re-run src.tools.quantize_model.")
+
+if use_tflite:
+  # Use the FP16 TFLite model built by src.tools.quantize_model.
+  # Interpreters are not thread-safe, so each prediction worker gets its own single-threaded one.
+  _tflite_local = threading.local()
+  
+  def _get_interpreter() -> tf.lite.Interpreter:
+    interpreter = getattr(_tflite_local, "interpreter", None)
+    if interpreter is None:
+      interpreter = tf.lite.Interpreter(model_path=str(tflite_path), num_threads=1)
+      _tflite_local.interpreter = interpreter
+    return interpreter
+  
+  _tflite_input = _get_interpreter().get_input_details()[0]["index"]
+  _tflite_output = _get_interpreter().get_output_details()[0]["index"]
+  
+  def _infer(x):
+    x = np.asarray(x, dtype=np.float32)
+    interpreter = _get_interpreter()
+    interpreter.resize_tensor_input(_tflite_input, x.shape)
+    interpreter.allocate_tensors()
+    interpreter.set_tensor(_tflite_input, x)
+    interpreter.invoke()
+    return interpreter.get_tensor(_tflite_output)
+else:
+  # Trace the inference graph once for the fixed window shape (batch size stays dynamic)
+  @tf.function(input_signature=[tf.TensorSpec(shape=[None, win_size, len(feature_cols)], dtype=tf.float32)])
+  def _infer(x):
+    return fused_model(x, training=False)
+
+# Warm up so the first request does not pay the tracing cost
+_infer(np.zeros((1, win_size, len(feature_cols)), dtype=np.float32))
+
 # Define function to estimate RUL from SoH
 def estimate_rul_from_soh(soh_pred: float) -> Dict[str, Any]:
   '''
@@ -98,6 +222,25 @@ def estimate_rul_from_soh(soh_pred: float) -> Dict[str, Any]:
     logging.error(f"Error in estimate_rul_from_soh: {e}")
     raise CustomException(e, sys)
 
+# Define function to smooth a series with a centered moving average
+def centered_moving_average(x: np.ndarray, window: int = 7) -> np.ndarray:
+  '''
+  Centered moving average that skips NaN values, equivalent to
+  pd.Series(x).rolling(window, min_periods=1, center=True).mean().\n
+  params:
+  - x (np.ndarray): Input values.
+  - window (int): Window size.
+  returns:
+  - np.ndarray: Smoothed values.
+  '''
+  x = np.asarray(x, dtype=float)
+  finite = np.isfinite(x)
+  kernel = np.ones(window)
+  offset = (window - 1) // 2
+  sums = np.convolve(np.where(finite, x, 0.0), kernel, mode="full")[offset : offset + len(x)]
+  counts = np.convolve(finite.astype(float), kernel, mode="full")[offset : offset + len(x)]
+  return np.divide(sums, counts, out=np.full(len(x), np.nan), where=counts > 0)
+
 # Define function to compute evaluation metrics
 def compute_eval_metrics(y_true, y_pred) -> Dict[str, Any]:
   try:
@@ -126,18 +269,76 @@ def compute_eval_metrics(y_true, y_pred) -> Dict[str, Any]:
     logging.error(f"Error in compute_eval_metrics: {e}")
     raise CustomException(e, sys)
 
+# Define function to build prediction cache key
+def get_prediction_cache_key(device_id: str) -> tuple:
+  '''
+  Function to build the prediction cache key from a cheap probe of the raw metrics table.\n
+  params:
+  - device_id (str): Device ID to probe.
+  returns:
+  - tuple: (device_id, last ts_utc, row count)
+  '''
+  try:
+    last_ts, n_rows = DataIngestion(table_name="raw_metrics", device_id=device_id).get_data_version()
+    return (device_id, last_ts, n_rows)
+  except Exception as e:
+    logging.error(f"Error in get_prediction_cache_key: {e}")
+    raise CustomException(e, sys)
+
+# Define async variant of the cache key probe
+async def aget_prediction_cache_key(device_id: str) -> tuple:
+  '''
+  Function to build the prediction cache key without blocking the event loop.\n
+  params:
+  - device_id (str): Device ID to probe.
+  returns:
+  - tuple: (device_id, last ts_utc, row count)
+  '''
+  try:
+    last_ts, n_rows = await DataIngestion(table_name="raw_metrics", device_id=device_id).aget_data_version()
+    return (device_id, last_ts, n_rows)
+  except Exception as e:
+    logging.error(f"Error in aget_prediction_cache_key: {e}")
+    raise CustomException(e, sys)
+
+# Define function to check the prediction cache
+def is_prediction_cached(cache_key: tuple) -> bool:
+  '''
+  Function to check under the cache lock whether a prediction is cached for the key.\n
+  params:
+  - cache_key (tuple): Key from get_prediction_cache_key.
+  returns:
+  - bool: True if a cached prediction exists.
+  '''
+  with PREDICTION_CACHE_LOCK:
+    return cache_key in PREDICTION_CACHE
+
 # Define function to run prediction pipeline
-def run_prediction_pipeline(device_id: str) -> PredictionResponse:
+def run_prediction_pipeline(device_id: str, df_raw: pd.DataFrame | None = None, cache_key: tuple | None = None) -> PredictionResponse:
   '''
   Function to run the prediction pipeline for a given device ID.\n
   params:
   - device_id (str): Device ID for which to run the prediction.
+  - df_raw (pd.DataFrame): Optional pre-fetched raw metrics. Fetched from Supabase when None.
+  - cache_key (tuple): Optional key from get_prediction_cache_key. Probed when None.
   returns:
   - dict: Dictionary with prediction results.
   '''
   try:
+    # Return cached result if raw metrics have not changed
+    if cache_key is None:
+      cache_key = get_prediction_cache_key(device_id)
+    with PREDICTION_CACHE_LOCK:
+      cached = PREDICTION_CACHE.get(cache_key)
+    if cached is not None:
+      logging.info(f"Prediction cache hit for device {device_id}")
+      return cached
+    
     # Load raw metrics
-    df_raw = DataIngestion(table_name="raw_metrics", device_id=device_id).extract_data_from_db(limit=20000)
+    if df_raw is None:
+      df_raw = DataIngestion(table_name="raw_metrics", device_id=device_id).extract_data_from_db(
+        limit=FETCH_ROWS, order_by="created_at", desc=False
+      )
     logging.info(f"RAW COLUMNS: {df_raw.columns.tolist()}")
     logging.info(f"RAW HEAD:\n{df_raw.head(5)}")
 
@@ -149,28 +350,15 @@ def run_prediction_pipeline(device_id: str) -> PredictionResponse:
     df_metrics = DataTransformation(data=df_raw).compute_metrics()
     logging.info(f"Metrics data shape {df_metrics.shape} for device {device_id}")
     
-    df_metrics = pd.get_dummies(df_metrics, columns=["fg_pkg"], prefix="app")
-    for col in feature_cols:
+    for col in numeric_cols:
       if col not in df_metrics.columns:
-        if col.startswith("app_"):
-          df_metrics[col] = 0.0
-        else:
-          logging.warning(f"Feature column {col} not found in metrics data. Filling with NaN.")
-    
-    extra_app_cols = [c for c in df_metrics.columns if c.startswith("app_") and c not in feature_cols]
-    if extra_app_cols:
-      df_metrics = df_metrics.drop(columns=extra_app_cols)
+        logging.warning(f"Feature column {col} not found in metrics data. Filling with NaN.")
     
-    # Check missing cols
-    required_cols = feature_cols + [target_col]
-    
-    df_feat = df_metrics.copy()
-    df_feat = df_feat.dropna(subset=feature_cols + [target_col])
+    # Rows already belong to a single device, dropna returns a new frame
     df_feat = (
-      df_feat
-      .sort_values(["device_id", "created_at"])    
-      .groupby("device_id")
-      .head(MAX_ROWS)   
+      df_metrics.dropna(subset=numeric_cols + [target_col])
+      .sort_values("created_at", kind="mergesort")
+      .head(MAX_ROWS)
       .reset_index(drop=True)
     )
     
@@ -184,31 +372,31 @@ def run_prediction_pipeline(device_id: str) -> PredictionResponse:
     soh_true_col = target_col
     
     # Build sliding windows for prediction
-    values = df_feat[feature_cols].values
+    if "fg_pkg" in df_feat.columns:
+      fg_pkg = df_feat[["fg_pkg"]].fillna("").astype(str).to_numpy()
+    else:
+      fg_pkg = np.full((len(df_feat), 1), "", dtype=object)
+    values = np.hstack([df_feat[numeric_cols].to_numpy(dtype=np.float32), ohe.transform(fg_pkg)], dtype=np.float32)
+    if feature_order is not None:
+      values = values[:, feature_order]
     n = len(values)
+    if n <= win_size:
+      raise ValueError(f"Not enough data to build windows: {n} rows, window size {win_size}.")
     
-    # Define list of sliding windows
-    windows = []
-    timestamps = []
-    soh_true_list = []
+    # Create sliding windows as a strided view, shape (n - win_size, win_size, n_features)
+    windows = np.lib.stride_tricks.sliding_window_view(values, (win_size, values.shape[1]))[:-1, 0]
+    timestamps = df_feat["created_at"].iloc[win_size:].tolist()
+    soh_true_list = df_feat[soh_true_col].to_numpy(dtype=float)[win_size:] * 100.0
     
-    # Create sliding window algorithm
-    for i in range(win_size, n):
-      win = values[i - win_size : i]
-      windows.append(win)
-      timestamps.append(df_feat["created_at"].iloc[i])
-      soh_true_list.append(float(df_feat[soh_true_col].iloc[i]) * 100.0)
-    
-    # Scaled input features
-    X = np.array(windows)
-    X_scaled = scaler.transform(X.reshape(-1, X.shape[-1])).reshape(X.shape)
-    soh_pred_arr = model.predict(X_scaled).reshape(-1) * 100.0
-    soh_pred_smooth_arr = (
-      pd.Series(soh_pred_arr)
-      .rolling(window=7, min_periods=1, center=True)
-      .mean()
-      .to_numpy()
-    )
+    # Scale and predict in a single graph call
+    if len(windows) <= INFER_BATCH:
+      soh_pred_arr = np.asarray(_infer(windows)).reshape(-1) * 100.0
+    else:
+      soh_pred_arr = np.concatenate([
+        np.asarray(_infer(windows[i:i + INFER_BATCH])).reshape(-1)
+        for i in range(0, len(windows), INFER_BATCH)
+      ]) * 100.0
+    soh_pred_smooth_arr = centered_moving_average(soh_pred_arr, window=7)
     
     # Last point for summary
     soh_pred_pct_last = safe_float(soh_pred_smooth_arr[-1], 0.0, field="soh_pred_pct_last") or 0.0
@@ -227,17 +415,25 @@ def run_prediction_pipeline(device_id: str) -> PredictionResponse:
     else:
       battery_cycles = None
     
-    # Define soh series
-    soh_series = []
-    for t, soh_t, soh_p, index in zip(timestamps, soh_true_list, soh_pred_arr, range(len(timestamps))):
-      # Take EFC for this point
-      efc_val = df_feat["EFC"].iloc[win_size + index] if "EFC" in df_feat.columns else None
-      soh_series.append({
+    # Sanitise series values once, invalid SoH becomes 0.0 and invalid EFC becomes None
+    soh_true_clean = np.nan_to_num(soh_true_list, nan=0.0, posinf=0.0, neginf=0.0).tolist()
+    soh_pred_clean = np.nan_to_num(soh_pred_arr, nan=0.0, posinf=0.0, neginf=0.0).tolist()
+    if "EFC" in df_feat.columns:
+      efc_arr = pd.to_numeric(df_feat["EFC"], errors="coerce").to_numpy(dtype=np.float64)[win_size:]
+      efc_clean = np.where(np.isfinite(efc_arr), efc_arr, None).tolist()
+    else:
+      efc_clean = [None] * len(timestamps)
+    
+    # Define soh series, with EFC aligned to each window target row
+    soh_series = [
+      {
         "created_at": t,
-        "soh_true": safe_float(soh_t, 0.0, field="soh_true"),
-        "soh_pred": safe_float(soh_p, 0.0, field="soh_pred"),
-        "efc": safe_float(efc_val, None, field="efc")
-      })
+        "soh_true": soh_t,
+        "soh_pred": soh_p,
+        "efc": efc_val
+      }
+      for t, soh_t, soh_p, efc_val in zip(timestamps, soh_true_clean, soh_pred_clean, efc_clean)
+    ]
     
     # Compute evaluation metrics
     metrics = compute_eval_metrics(soh_true_list, soh_pred_arr)
@@ -252,7 +448,7 @@ def run_prediction_pipeline(device_id: str) -> PredictionResponse:
     )
 
     
-    return PredictionResponse(
+    response = PredictionResponse(
       message="Prediction successful",
       device_id=device_id,
       soh_pred_pct=soh_pred_pct_last,
@@ -266,10 +462,44 @@ def run_prediction_pipeline(device_id: str) -> PredictionResponse:
       rmse_pct=safe_float(metrics["rmse_pct"], None, "rmse_pct"),
       r2_soh=safe_float(metrics["r2_soh"], None, "r2_soh")
     )
+    with PREDICTION_CACHE_LOCK:
+      PREDICTION_CACHE[cache_key] = response
+    return response
   except Exception as e:
     logging.error(f"Error in run_prediction_pipeline: {e}")
     raise CustomException(e, sys)
 
+# Define function to run predictions for several devices concurrently
+async def run_prediction_pipelines(device_ids: List[str], fetch_raw=None) -> List[PredictionResponse | Exception]:
+  '''
+  Function to run the prediction pipeline for several devices in parallel.
+  A device that fails does not fail the others; its exception is returned in its place.\n
+  params:
+  - device_ids: List of device ids to predict.
+  - fetch_raw: Optional async callable(device_id) returning the raw metrics DataFrame, or None.\n
+  returns:
+  - List of PredictionResponse or the raised exception, in the same order as device_ids.
+  '''
+  try:
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(MAX_CONCURRENT_PREDICTIONS)
+    
+    async def predict_one(device_id: str) -> PredictionResponse:
+      async with sem:
+        cache_key = await aget_prediction_cache_key(device_id)
+        df_raw = None
+        if fetch_raw is not None and not is_prediction_cached(cache_key):
+          df_raw = await fetch_raw(device_id)
+        return await loop.run_in_executor(
+          PREDICTION_EXECUTOR,
+          lambda: run_prediction_pipeline(device_id=device_id, df_raw=df_raw, cache_key=cache_key)
+        )
+    
+    return await asyncio.gather(*(predict_one(device_id) for device_id in device_ids), return_exceptions=True)
+  except Exception as e:
+    logging.error(f"Error in run_prediction_pipelines: {e}")
+    raise CustomException(e, sys)
+
 # Define safe float controller
 def safe_float(x: Any, default: float | None = 0.0, field:str | None = None):
   '''
@@ -294,4 +524,18 @@ def safe_float(x: Any, default: float | None = 0.0, field:str | None = None):
   except Exception:
     if field:
       logging.warning(f"Error converting field {field} value {x} to float. Returning default {default}.")
-    return default
\ No newline at end of file
+    return default
+
+# Define vectorized safe float controller
+def safe_float_col(s: Any, default: float = 0.0, dtype: Any = np.float64) -> np.ndarray:
+  '''
+  Function to convert a whole column to floats, replacing NaN, infinite or non-numeric values.\n
+  params:
+  - s: Series or array-like to convert.
+  - default (float): Value used for invalid entries.
+  - dtype: Output dtype.
+  returns:
+  - np.ndarray of cleaned values.
+  '''
+  arr = pd.to_numeric(pd.Series(s, copy=False), errors="coerce").to_numpy(dtype=dtype)
+  return np.where(np.isfinite(arr), arr, default).astype(dtype, copy=False)
\ No newline at end of file
@@ -5,25 +5,85 @@ This module defines the recommendation controller functions to handle recommenda
 
 import os
 import sys
-from typing import List, Dict, Any, Literal
+from typing import List, Dict, Any, Literal, Tuple
 
 from src.exception.exception import CustomException
 from src.logging.logging import logging
-from src.service.impact_calculation import compute_ewaste_impact
+from src.service.impact_calculation import compute_ewaste_impact_batch
 from src.api.model.impact_model import (
   ImpactRequest,
   ImpactResponse,
-  EwasteImpact
+  EwasteImpact,
+  ScenarioPair
 )
 from src.service.expiry_date_calculation import compute_expiry_date
 
+# Validate response models on construction (development only)
+VALIDATE_RESPONSES = os.getenv("VALIDATE_RESPONSES", "false").lower() == "true"
+
+# Response message and scenario names
+IMPACT_MESSAGE_OK = "Impact calculation successful"
+IMPACT_SCENARIOS = ("conservative", "optimistic")
+
 # Threshold constants
 SOH_THRESHOLD_GOOD = 70.0
 RUL_MONTHS_LONG = 24.0
 RUL_MONTHS_SHORT = 3.0
 
-# Define function to recommend action
+# Define recommended action literal
 ActionLiteral = Literal["hold_phone", "replace_screen", "replace_battery", "replace_phone"]
+
+# Define function to bucket decision inputs
+def _bucket(soh_pred_pct: float, rul_months: float, screen_label: str) -> Tuple[int, int, str]:
+  '''
+  Function to map decision inputs onto the threshold buckets used by the action rules.\n
+  params:
+  - soh_pred_pct: Predicted State of Health percentage of the battery.
+  - rul_months: Remaining Useful Life in months.
+  - screen_label: Label indicating screen condition.
+  returns:
+  - Tuple of (soh bucket, rul bucket, screen label), -1 marks a value that fails every comparison (NaN).
+  '''
+  if soh_pred_pct >= SOH_THRESHOLD_GOOD:
+    soh_bucket = 1
+  elif soh_pred_pct < SOH_THRESHOLD_GOOD:
+    soh_bucket = 0
+  else:
+    soh_bucket = -1
+  
+  if rul_months >= RUL_MONTHS_LONG:
+    rul_bucket = 2
+  elif rul_months >= RUL_MONTHS_SHORT:
+    rul_bucket = 1
+  elif rul_months < RUL_MONTHS_SHORT:
+    rul_bucket = 0
+  else:
+    rul_bucket = -1
+  return soh_bucket, rul_bucket, screen_label
+
+# Define action table over bucketed inputs, other states fall back by SoH bucket
+_ACTION_TABLE: Dict[Tuple[int, int, str], str] = {
+  # Good battery health
+  (1, 2, "safe"): "hold",
+  (1, 2, "warning"): "replace_screen",
+  (1, 2, "broken"): "replace_screen",
+  # Poor battery health and critical screen
+  (0, 0, "warning"): "replace_phone",
+  (0, 0, "broken"): "replace_phone",
+}
+
+# Define decision lookup over bucketed inputs
+def _decide(bucket: Tuple[int, int, str]) -> ActionLiteral:
+  action = _ACTION_TABLE.get(bucket)
+  if action is not None:
+    return action
+  
+  # Good battery with an unlisted screen label still needs a screen check
+  if bucket[0] == 1 and bucket[1] == 2:
+    return "replace_screen"
+  return "replace_battery" if bucket[0] == 0 else "hold"
+
+# Define function to recommend action
 def decide_recommendation_action(soh_pred_pct: float, rul_months: float, screen_label: str) -> ActionLiteral:
   '''
   Function to recommend action based on state of health (SOH) and remaining useful life (RUL).\n
@@ -35,27 +95,7 @@ def decide_recommendation_action(soh_pred_pct: float, rul_months: float, screen_
   - Recommended action as a string literal.
   '''
   try:
-    # Case for good battery health
-    if soh_pred_pct >= SOH_THRESHOLD_GOOD and rul_months >= RUL_MONTHS_LONG:
-      if screen_label == "safe":
-        return "hold"
-      else:
-        return "replace_screen"
-    
-    # Case for moderate battery health
-    if soh_pred_pct < SOH_THRESHOLD_GOOD and rul_months >= RUL_MONTHS_SHORT and screen_label == "safe":
-      return "replace_battery"
-    
-    # Case for poor battery health or critical screen
-    if soh_pred_pct < SOH_THRESHOLD_GOOD and rul_months < RUL_MONTHS_SHORT and screen_label in ["warning", "broken"]:
-      return "replace_phone"
-    
-    # Fallback case
-    if soh_pred_pct < SOH_THRESHOLD_GOOD:
-      return "replace_battery"
-    
-    # Default action
-    return "hold"
+    return _decide(_bucket(soh_pred_pct, rul_months, screen_label))
   except Exception as e:
     raise CustomException(e, sys)
 
@@ -69,7 +109,7 @@ def run_impact_calculation(payload: ImpactRequest) -> ImpactResponse:
   - ImpactResponse object containing recommendation and impact metrics.
   '''
   try:
-    logging.info(f"Running impact calculation for device_id: {payload.device_id}")
+    logging.info("Running impact calculation for device_id: %s", payload.device_id)
     
     # Decide recommendation action
     action = decide_recommendation_action(
@@ -77,20 +117,25 @@ def run_impact_calculation(payload: ImpactRequest) -> ImpactResponse:
       rul_months=payload.rul_months,
       screen_label=payload.screen_label
     )
-    logging.info(f"Recommended action: {action}")
+    logging.info("Recommended action: %s", action)
     
     # Compute e-waste impact for both scenarios
-    scenarios_result: Dict[str, EwasteImpact] = {}
-    for scen in ["conservative", "optimistic"]:
-      raw = compute_ewaste_impact(action=action, scenario=scen)
-      scenarios_result[scen] = raw
+    impacts: Dict[str, EwasteImpact] = compute_ewaste_impact_batch(
+      action=action,
+      scenarios=IMPACT_SCENARIOS
+    )
+    scenarios_result = ScenarioPair.model_construct(
+      conservative=impacts["conservative"],
+      optimistic=impacts["optimistic"]
+    )
     
     # Callculate expiry date
     expiry_date = compute_expiry_date(rul_months=payload.rul_months)
     
-    # Construct response model
-    response = ImpactResponse(
-      message="Impact calculation successful",
+    # Construct response model, skipping validation for trusted service output
+    response_cls = ImpactResponse if VALIDATE_RESPONSES else ImpactResponse.model_construct
+    response = response_cls(
+      message=IMPACT_MESSAGE_OK,
       device_id=payload.device_id,
       action=action,
       soh_pred_pct=payload.soh_pred_pct,
@@ -99,7 +144,9 @@ def run_impact_calculation(payload: ImpactRequest) -> ImpactResponse:
       expiry_date=expiry_date,
       scenarios=scenarios_result
     )
-    logging.info(f"Impact calculation response: {response}")
+    # Only render the full response when debug logging is enabled
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+      logging.debug("Impact calculation response: %r", response)
     return response
   except Exception as e:
     raise CustomException(e, sys)
\ No newline at end of file
@@ -0,0 +1,63 @@
+'''
+Response cache module for hot dashboard polling routes.
+Serialized response bodies are kept for a few seconds per (route, device_id, ...)
+key and dropped as soon as new samples for the device are written.
+'''
+
+import threading
+
+from typing import Iterable
+from cachetools import TTLCache
+from fastapi import Request, Response
+
+from src.api.controller.etag_controller import etag_matches
+
+# Shared cache of (etag, body) per response key
+RESPONSE_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=5)
+RESPONSE_CACHE_LOCK = threading.Lock()
+
+# Define function to return a cached response
+def get_cached_response(request: Request, key: tuple) -> Response | None:
+  '''
+  Function to build a response from the cache, honouring If-None-Match.\n
+  params:
+  - request: Incoming request.
+  - key: Cache key, with the device ID as its second item.\n
+  returns:
+  - 304 or 200 response on a cache hit, otherwise None.
+  '''
+  with RESPONSE_CACHE_LOCK:
+    cached = RESPONSE_CACHE.get(key)
+  if cached is None:
+    return None
+  etag, body = cached
+  if etag_matches(request, etag):
+    return Response(status_code=304, headers={"ETag": etag})
+  return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+# Define function to cache a serialized response
+def cache_response(key: tuple, etag: str, body: bytes) -> Response:
+  '''
+  Function to cache a serialized JSON body and return it as a response.\n
+  params:
+  - key: Cache key, with the device ID as its second item.
+  - etag: ETag of the response.
+  - body: Serialized JSON body.\n
+  returns:
+  - JSON response with the ETag header.
+  '''
+  with RESPONSE_CACHE_LOCK:
+    RESPONSE_CACHE[key] = (etag, body)
+  return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+# Define function to drop cached responses of devices
+def invalidate_devices(device_ids: Iterable[str]) -> None:
+  '''
+  Function to drop every cached response of the given devices.\n
+  params:
+  - device_ids: Device IDs that just received new samples.
+  '''
+  device_ids = set(device_ids)
+  with RESPONSE_CACHE_LOCK:
+    for key in [key for key in RESPONSE_CACHE.keys() if key[1] in device_ids]:
+      RESPONSE_CACHE.pop(key, None)
\ No newline at end of file
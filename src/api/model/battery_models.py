@@ -2,7 +2,7 @@
 Data models for battery health metrics.
 This module defines data structures for storing and processing battery health metrics.
 '''
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 from typing import List, Optional
 from datetime import datetime
 
@@ -26,4 +26,7 @@ class BatteryCycles(BaseModel):
 class BatteryMetricsResponse(BaseModel):
   device_id: str
   soh_data: List[StateOfHealth]
-  cycles_data: List[BatteryCycles]
\ No newline at end of file
+  cycles_data: List[BatteryCycles]
+
+# Define response adapter, built once and reused by the battery routes
+BATTERY_METRICS_ADAPTER = TypeAdapter(BatteryMetricsResponse)
\ No newline at end of file
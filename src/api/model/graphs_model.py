@@ -2,7 +2,7 @@
 Graphs visualization models
 This module defines the data models used for graph visualization based on throughput metrics.
 '''
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 
@@ -54,4 +54,7 @@ class SummaryMetricsResponse(BaseModel):
   window_start: datetime | None
   window_end: datetime | None
   sample_last: int
-  summary: SummaryMetrics | None
\ No newline at end of file
+  summary: SummaryMetrics | None
+
+# Define response adapter, built once and reused by the graph routes
+GRAPHS_HISTORY_ADAPTER = TypeAdapter(GraphsHistoryResponse)
\ No newline at end of file
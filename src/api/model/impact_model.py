@@ -3,12 +3,14 @@ Model definitions for impact analysis.
 This module defines data models used for representing the impact analysis results.
 '''
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Dict, Any, Literal
 from datetime import datetime
 
 # Define e-waste impact model
 class EwasteImpact(BaseModel):
+  model_config = ConfigDict(frozen=True)
+  
   alpha: float = Field(..., description="Proportion of e-waste mitigated through the system")
   ewaste_baseline_kg: float
   ewaste_with_system_kg: float
@@ -16,6 +18,11 @@ class EwasteImpact(BaseModel):
   carbon_saved_kg: float
   car_km_equivalent: float
 
+# Define scenario pair model
+class ScenarioPair(BaseModel):
+  conservative: EwasteImpact
+  optimistic: EwasteImpact
+
 # Define impact request model
 class ImpactRequest(BaseModel):
   device_id: str
@@ -32,4 +39,4 @@ class ImpactResponse(BaseModel):
   rul_months: float
   screen_label: Literal["safe", "warning", "broken"]
   expiry_date: datetime
-  scenarios: Dict[Literal["conservative", "optimistic"], EwasteImpact]
\ No newline at end of file
+  scenarios: ScenarioPair
\ No newline at end of file
@@ -1,7 +1,7 @@
 '''
 Models for prediction visualization API responses.
 '''
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 
@@ -12,8 +12,10 @@ class SoHPrediction(BaseModel):
   soh_pred: float
   efc: float | None
 
-# Define prediction response model
-class PredictionResponse(BaseModel):
+# Define shared prediction fields
+class _PredictionBase(BaseModel):
+  model_config = ConfigDict(defer_build=True)
+  
   message: str
   device_id: str
   soh_pred_pct: float
@@ -21,12 +23,26 @@ class PredictionResponse(BaseModel):
   rul_cycles: float
   rul_months: float
   rul_hours: float
+
+# Define prediction response model
+class PredictionResponse(_PredictionBase):
   soh_series: List[SoHPrediction]
   expiry_date: datetime
   mae_pct: float
   rmse_pct: float
   r2_soh: float
 
+# Define per-device error of a batch prediction
+class PredictionError(BaseModel):
+  device_id: str
+  detail: str
+
+# Define batch prediction response model
+class BatchPredictionResponse(BaseModel):
+  message: str
+  predictions: List[PredictionResponse]
+  errors: List[PredictionError]
+
 # Define image prediction model
 class ImagePredictionResponse(BaseModel):
   message: str = Field("Image prediction successful", description="Response message indicating the status of the image prediction.")
@@ -2,7 +2,7 @@
 Raw metrics data model.
 This module defines the RawMetrics class for handling raw metrics data.
 '''
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, TypeAdapter, create_model
 from typing import Optional, List, Dict, Any
 from datetime import datetime
 
@@ -29,6 +29,17 @@ class RawMetrics(BaseModel):
   battery_capacity_pct: int
   current_avg_ua: Optional[int] = None
 
+# Define ingest payload model: RawMetrics column types, only device_id required, extra keys kept.
+# Validates the keys a sample sends so a bad value is rejected before it is queued.
+RawMetricsPayload = create_model(
+  "RawMetricsPayload",
+  __config__=ConfigDict(extra="allow"),
+  **{
+    name: (field.annotation, ...) if name == "device_id" else (Optional[field.annotation], None)
+    for name, field in RawMetrics.model_fields.items()
+  }
+)
+
 # Define metrics for throughput
 class ThroughputMetrics(BaseModel):
   device_id: Optional[str] = None
@@ -41,4 +52,7 @@ class ThroughputMetrics(BaseModel):
 class RawMetricsResponse(BaseModel):
   message: str
   data: List[Dict[str, Any]]
-  throughput: Optional[List[ThroughputMetrics]] = None
\ No newline at end of file
+  throughput: Optional[List[ThroughputMetrics]] = None
+
+# Define response adapter, built once and reused by the raw metrics route
+RAW_METRICS_ADAPTER = TypeAdapter(RawMetricsResponse)
\ No newline at end of file
@@ -7,23 +7,75 @@ import pandas as pd
 import numpy as np
 import os
 import sys
+import orjson
 
-from fastapi import APIRouter, HTTPException, Query
-from typing import List, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from typing import List, Dict, Any, Tuple
 from src.logging.logging import logging
-from src.api.model.battery_models import BatteryMetricsResponse
+from src.api.model.battery_models import BatteryMetricsResponse, BATTERY_METRICS_ADAPTER
+from supabase import Client
+from src.api.controller.db_controller import get_supabase
 from src.pipeline.data_ingestion import DataIngestion
 from src.pipeline.data_transformation import DataTransformation
-from src.api.controller.prediction_controller import safe_float
+from src.api.controller.prediction_controller import safe_float, safe_float_col
 
 # Define router instance
 router = APIRouter()
 
+# Rows per chunk when streaming battery metrics
+STREAM_CHUNK_ROWS = 500
+
+# Define function to build SoH frame for a device
+def build_soh_frame(
+  device_id: str, table_name: str, limit: int = 1000,
+  supabase: Client | None = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+  '''
+  Function to compute cleaned SoH rows for a device.\n
+  params:
+  - device_id: Device ID to filter data.
+  - table_name: Table name to retrieve data from.
+  - limit: Number of latest rows to fetch.
+  - supabase: Optional shared Supabase client.\n
+  returns:
+  - Tuple of (SoH frame, full metrics frame), both empty if no data is available.
+  '''
+  # Latest rows ordered by the database, reversed to ascending as a view
+  df_raw = DataIngestion(table_name=table_name, device_id=device_id, supabase=supabase).extract_data_from_db(
+    limit=limit, order_by="ts_utc", desc=True
+  ).iloc[::-1]
+  if df_raw.empty:
+    return pd.DataFrame(), pd.DataFrame()
+  
+  # Calculate battery metrics
+  df_metrics = DataTransformation(data=df_raw).compute_metrics()
+  if df_metrics.empty:
+    return pd.DataFrame(), df_metrics
+  
+  # Keep rows with a finite soh_pct, then clean each numeric column in one vectorized call
+  soh_num_cols = ["Q_mAh", "Ct_mAh", "soh_pct"]
+  df_soh = df_metrics.reindex(columns=["device_id", "created_at"] + soh_num_cols)
+  keep = np.flatnonzero(np.isfinite(safe_float_col(df_soh["soh_pct"], default=np.nan)))
+  if keep.size == 0:
+    return pd.DataFrame(), df_metrics
+  
+  df_soh = df_soh.iloc[keep]
+  df_soh = df_soh[["device_id", "created_at"]].assign(**{c: safe_float_col(df_soh[c]) for c in soh_num_cols})
+  return df_soh, df_metrics
+
+# Define JSON fallback for values orjson does not handle natively
+def _json_default(value: Any) -> Any:
+  if isinstance(value, pd.Timestamp):
+    return value.isoformat()
+  raise TypeError(f"Type {type(value)} is not JSON serializable")
+
 # Define battery metrics retrieval route
 @router.get("/metrics", status_code=200, response_model=BatteryMetricsResponse)
 async def get_battery_metrics(
   device_id: str = Query(..., description="Device ID for user devices"),
-  table_name: str = Query(..., description="Table name to retrieve data from")) -> BatteryMetricsResponse:
+  table_name: str = Query(..., description="Table name to retrieve data from"),
+  supabase: Client = Depends(get_supabase)) -> BatteryMetricsResponse:
   '''
   Function to calculate and send battery metrics data for visualization.\n
   params:
@@ -32,51 +84,8 @@ async def get_battery_metrics(
   - BatteryMetricsResponse: Response model containing battery metrics data.
   '''
   try:
-    # Create dataframe from pipeline
-    df_raw = DataIngestion(table_name=table_name, device_id=device_id).extract_data_from_db(limit=1000)
-    if df_raw.empty:
-      return {
-        "device_id": device_id,
-        "soh_data": [],
-        "cycles_data": [],
-      }
-    
-    # Calculate battery metrics
-    df_metrics = DataTransformation(data=df_raw).compute_metrics()
-    if df_metrics.empty:
-      return {
-        "device_id": device_id,
-        "soh_data": [],
-        "cycles_data": [],
-      }
-    
-    # Create datetime column
-    df_metrics["created_at"] = pd.to_datetime(df_metrics["created_at"])
-    if "ts_utc" in df_metrics.columns:
-      df_metrics["ts_utc"] = pd.to_datetime(df_metrics["ts_utc"])
-      df_metrics = df_metrics.sort_values("ts_utc")
-    else:
-      df_metrics = df_metrics.sort_values("created_at")
-    
-    # Create list of numerical cols for data sanitation
-    numerical_cols = [
-      "Q_mAh", "Ct_mAh", "soh_pct", "soh_smooth", 
-      "delta_Q_mAh", "discharge_mAh", "EFC"
-    ]
-    required_cols = ["device_id", "created_at"] + numerical_cols
-    available_soh_cols = [col for col in required_cols if col in df_metrics.columns]
-    df_soh = df_metrics[available_soh_cols].copy()
-    
-    # Clean inf and NaN
-    df_soh = df_soh.replace([np.inf, -np.inf], np.nan)
-    if "soh_pct" in df_soh.columns:
-      df_soh = df_soh.dropna(subset=["soh_pct"])
-    
-    for col in ["Q_mAh", "Ct_mAh"]:
-      if col in df_soh.columns:
-        df_soh[col] = df_soh[col].fillna(0.0)
-    
-    df_soh = df_soh.tail(1000)
+    # Create dataframe from pipeline off the event loop
+    df_soh, df_metrics = await run_in_threadpool(build_soh_frame, device_id=device_id, table_name=table_name, supabase=supabase)
     
     # Check if soh_df is empty
     if df_soh.empty:
@@ -85,33 +94,52 @@ async def get_battery_metrics(
         "soh_data": [],
         "cycles_data": [],
       }
-    
-    
-    # Take 100 last SoH data points
-    soh_data = []
-    for _, row in df_soh.iterrows():
-      soh_data.append({
-        "device_id": row["device_id"],
-        "created_at": row["created_at"],
-        "Q_mAh": safe_float(row["Q_mAh"], 0.0, field="Q_mAh"),
-        "Ct_mAh": safe_float(row["Ct_mAh"], 0.0, field="Ct_mAh"),
-        "soh_pct": safe_float(row["soh_pct"], 0.0, field="soh_pct"),
-      })
+    soh_data = df_soh.to_dict(orient="records")
     
     # Take latest data from metrics
     latest = df_metrics.iloc[-1]
     cycles_data = [{
       "device_id": latest["device_id"],
-      "created_at": latest["created_at"].isoformat() if pd.notna(latest["created_at"]) else None,
+      "created_at": latest["created_at"] if pd.notna(latest["created_at"]) else None,
       "delta_charge_uah": safe_float(latest.get("delta_Q_mAh"), 0.0, field="delta_charge_uah"),
       "discharge_uah": safe_float(latest.get("discharge_mAh"), 0.0, field="discharge_uah"),
       "cycles_est": safe_float(latest.get("EFC"), 0.0, field="EFC"),
     }]
-    # Return battery metrics response
-    return {
+    # Return battery metrics response, validated once and serialised straight to JSON bytes
+    response = BATTERY_METRICS_ADAPTER.validate_python({
       "device_id": device_id,
       "soh_data": soh_data,
       "cycles_data": cycles_data,
-    }
+    })
+    return Response(content=BATTERY_METRICS_ADAPTER.dump_json(response), media_type="application/json")
+  except Exception as e:
+    raise HTTPException(status_code=500, detail=f"Error retrieving battery metrics: {e}")
+
+# Define streaming battery metrics route for large windows
+@router.get("/metrics/stream", status_code=200)
+async def stream_battery_metrics(
+  device_id: str = Query(..., description="Device ID for user devices"),
+  table_name: str = Query(..., description="Table name to retrieve data from"),
+  limit: int = Query(5000, ge=10, le=50000, description="Data fetch limit"),
+  supabase: Client = Depends(get_supabase)) -> StreamingResponse:
+  '''
+  Function to stream SoH data points as newline-delimited JSON.\n
+  params:
+  - device_id: Device ID to filter data.
+  - limit: Number of latest rows to fetch.\n
+  returns:
+  - StreamingResponse with one JSON object per line.
+  '''
+  try:
+    # Fetch and transform off the event loop, the window can be up to 50000 rows
+    df_soh, _ = await run_in_threadpool(build_soh_frame, device_id=device_id, table_name=table_name, limit=limit, supabase=supabase)
+    
+    # Serialise chunk by chunk so the full payload is never held in memory
+    def iter_lines():
+      for start in range(0, len(df_soh), STREAM_CHUNK_ROWS):
+        records = df_soh.iloc[start:start + STREAM_CHUNK_ROWS].to_dict(orient="records")
+        yield b"".join(orjson.dumps(r, default=_json_default) + b"\n" for r in records)
+    
+    return StreamingResponse(iter_lines(), media_type="application/x-ndjson")
   except Exception as e:
-    raise HTTPException(status_code=500, detail=f"Error retrieving battery metrics: {e}")
\ No newline at end of file
+    raise HTTPException(status_code=500, detail=f"Error streaming battery metrics: {e}")
\ No newline at end of file
@@ -7,8 +7,10 @@ import os
 
 from fastapi import APIRouter, HTTPException, Query, Request
 from typing import List, Dict, Any
+from pydantic import ValidationError
+from src.api.controller.ingest_controller import enqueue_raw_metric
+from src.api.model.raw_metrics import RawMetricsPayload
 from src.logging.logging import logging
-from src.api.controller.db_controller import create_supabase_connection
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -35,48 +37,19 @@ async def get_data_from_smartphone(request: Request) -> Dict[str, Any]:
     if "device_id" not in payload:
       raise HTTPException(status_code=400, detail="Missing 'device_id' in request payload!")
     
-    # Create supabase connection
-    logging.info("Creating Supabase connection...")
-    supabase = create_supabase_connection()
-    
-    # Look for user_id based on device_id
-    logging.info("Looking for user_id based on device_id...")
-    device_id = payload["device_id"]
-    user_id = None
-    
-    logging.info(f"Fetching user_id for device_id: {device_id}...")
-    try:
-      if device_id:
-        row = (
-          supabase.table("devices")
-          .select("user_id")
-          .eq("device_id", device_id)
-          .maybe_single()
-          .execute()
-        )
-        if row.data and row.data.get("user_id"):
-          user_id = row.data["user_id"]
-    except Exception:
-      pass
-    
-    # Insert user_id to payload if found
-    if user_id:
-      payload["user_id"] = user_id
-    
     # Check if there is not SUPABASE credentials
     if not URL or not API_KEY:
       raise HTTPException(status_code=500, detail="Supabase credentials are not set properly!")
     
-    # Insert data to supabase
-    logging.info("Inserting data to Supabase...")
-    supabase.table("raw_metrics").insert(payload).execute()
-    
-    # Insert to raw_metrics_5min
-    logging.info("Inserting data to raw_metrics_5min...")
+    # Validate the sent values now; once queued the sender already has its response
     try:
-      supabase.table("raw_metrics_5min").insert(payload).execute()
-    except Exception as e:
-      logging.error(f"Error inserting to raw_metrics_5min: {e}")
+      payload = RawMetricsPayload.model_validate(payload).model_dump(mode="json", exclude_unset=True)
+    except ValidationError as e:
+      raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False, include_input=False))
+    
+    # Queue the sample; the ingest worker writes it in the next batch
+    logging.info(f"Queueing data for device_id: {payload['device_id']}...")
+    await enqueue_raw_metric(payload)
     
     # Return success response
     return {
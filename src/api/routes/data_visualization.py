@@ -6,24 +6,36 @@ import os
 import sys
 import pandas as pd
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from typing import List, Dict, Any
 
 from src.logging.logging import logging
-from src.api.model.raw_metrics import RawMetricsResponse
+from src.api.model.raw_metrics import RawMetricsResponse, ThroughputMetrics, RAW_METRICS_ADAPTER
 from src.api.model.usage_app_models import AppUsageResponse
+from supabase import Client
+from src.api.controller.db_controller import get_supabase
+from src.api.controller.etag_controller import build_etag, etag_matches
 from src.pipeline.data_ingestion import DataIngestion
 from src.pipeline.data_transformation import DataTransformation
-from src.api.controller.prediction_controller import safe_float
+from src.api.controller.prediction_controller import safe_float, safe_float_col
 
 # Define router instance
 router = APIRouter()
 
+# Latest row plus the one before it, enough for one throughput delta
+LATEST_ROWS = 2
+
+# Columns needed to compute per-app usage
+APP_USAGE_COLUMNS = ["device_id", "created_at", "ts_utc", "fg_pkg", "tx_total_bytes", "rx_total_bytes"]
+
 # Define data retrieval route
 @router.get("/raw-metrics", status_code=200, response_model=RawMetricsResponse)
 async def visualize_data_from_smartphone(
+  request: Request,
+  response: Response,
   table_name:str = Query(..., description="Fetch latest record for specific table_name"),
-  device_id:str = Query(..., description="Device ID to filter data")) -> RawMetricsResponse:
+  device_id:str = Query(..., description="Device ID to filter data"),
+  supabase: Client = Depends(get_supabase)) -> RawMetricsResponse:
   '''
   Function to get raw metrics data from smartphone devices.\n
   params:
@@ -34,8 +46,16 @@ async def visualize_data_from_smartphone(
   '''
   try:
     # Create throuhgput metrics
-    ingestion = DataIngestion(table_name=table_name, device_id=device_id)
-    df_raw = ingestion.extract_data_from_db(limit=10)
+    ingestion = DataIngestion(table_name=table_name, device_id=device_id, supabase=supabase)
+    
+    # Return 304 when the client already has the latest data
+    etag = build_etag("raw-metrics", table_name, device_id, *await ingestion.aget_data_version())
+    if etag_matches(request, etag):
+      return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    
+    # Rows come back newest first, ordered by ts_utc in the database
+    df_raw = await ingestion.aextract_data_from_db(limit=LATEST_ROWS, order_by="ts_utc", desc=True)
     
     # Check if data is empty
     if df_raw.empty:
@@ -44,19 +64,17 @@ async def visualize_data_from_smartphone(
         "data": [],
         "throughput": []
       }
-    transformed = DataTransformation(data=df_raw).compute_throughput()
+    # Reversed view is already in time order, so the throughput guard does not re-sort
+    transformed = DataTransformation(data=df_raw.iloc[::-1]).compute_throughput()
     logging.info(f"Transformed data type: {type(transformed)}")
     logging.info(f"Transformed data shape: {transformed.shape}")
     
-    # Take last record of transformed data
-    df_raw["ts_utc"] = pd.to_datetime(df_raw["ts_utc"]) 
-    df_raw = df_raw.sort_values(by="ts_utc")
-    latest_raw = df_raw.iloc[-1].to_dict()
+    # Take latest raw record
+    latest_raw = df_raw.iloc[0].to_dict()
     
-    # Check if transformed data is not empty
+    # Check if transformed data is not empty; it is sorted oldest first
     latest_thr_dict = None
     if not transformed.empty:
-      transformed = transformed.sort_values("ts_utc")
       latest_thr_dict = transformed.iloc[-1].to_dict()
       latest_thr_dict = {
         "device_id": latest_thr_dict["device_id"],
@@ -66,13 +84,14 @@ async def visualize_data_from_smartphone(
         "throughput_total_mbps": safe_float(latest_thr_dict["throughput_total_mbps"], 0.0, field="throughput_total_mbps"),
       }
     
-    # Return responses
+    # Return response built without re-validation and serialised straight to JSON bytes
     logging.info("Data retrieved successfully.")
-    return {
-      "message": "Data has been retrieved successfully",
-      "data": [latest_raw],
-      "throughput": [latest_thr_dict] if latest_thr_dict else []
-    }
+    raw_response = RawMetricsResponse.model_construct(
+      message="Data has been retrieved successfully",
+      data=[latest_raw],
+      throughput=[ThroughputMetrics.model_construct(**latest_thr_dict)] if latest_thr_dict else []
+    )
+    return Response(content=RAW_METRICS_ADAPTER.dump_json(raw_response), media_type="application/json", headers={"ETag": etag})
   except Exception as e:
     raise HTTPException(status_code=500, detail=str(e))
 
@@ -81,7 +100,8 @@ async def visualize_data_from_smartphone(
 async def get_app_usage_stats(
   device_id:str = Query(..., description="Device ID to filter data"),
   top_rank:int = Query(4, description="Number of top applications to consider for usage statistics"),
-  table_name:str = Query("raw_metrics", description="Table name to filter data")
+  table_name:str = Query("raw_metrics", description="Table name to filter data"),
+  supabase: Client = Depends(get_supabase)
   ) -> AppUsageResponse:
   '''
   Function to get application usage statistics for a specific device.\n
@@ -93,8 +113,8 @@ async def get_app_usage_stats(
   '''
   try:
     # Ingest raw data
-    ingestion = DataIngestion(table_name=table_name, device_id=device_id)
-    df_raw = ingestion.extract_data_from_db(limit=200)
+    ingestion = DataIngestion(table_name=table_name, device_id=device_id, supabase=supabase)
+    df_raw = await ingestion.aextract_data_from_db(limit=200, columns=APP_USAGE_COLUMNS)
     
     # Check if data is empty
     if df_raw.empty:
@@ -111,16 +131,17 @@ async def get_app_usage_stats(
         "usage_stats": []
       }
     
-    # Return usage statistics
-    usage_stats = []
-    for _, row in usage_df.iterrows():
-      usage_stats.append({
-        "device_id": row["device_id"],
-        "fg_pkg": row["fg_pkg"],
-        "total_mb": safe_float(row["total_mb"], 0.0, field="total_mb"),
-        "avg_throughput_mbps": safe_float(row["avg_throughput_mbps"], 0.0, field="avg_throughput_mbps"),
-        "rank": int(row["rank"])
-      })
+    # Return usage statistics built from whole columns
+    usage_stats = [
+      {"device_id": d, "fg_pkg": p, "total_mb": t, "avg_throughput_mbps": a, "rank": r}
+      for d, p, t, a, r in zip(
+        usage_df["device_id"].tolist(),
+        usage_df["fg_pkg"].tolist(),
+        safe_float_col(usage_df["total_mb"]).tolist(),
+        safe_float_col(usage_df["avg_throughput_mbps"]).tolist(),
+        usage_df["rank"].astype("int32").tolist(),
+      )
+    ]
 
     # Return response
     return {
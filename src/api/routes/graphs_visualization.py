@@ -3,27 +3,105 @@ Graphs Visualization Routes Module
 This module defines the API routes for visualizing graphs based on throughput metrics.
 '''
 import pandas as pd
-from fastapi import APIRouter, HTTPException, Query
-from typing import List, Dict, Any
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import List, Dict, Any, Tuple, Type
 
 from src.logging.logging import logging
 from src.api.model.graphs_model import (
   GraphsHistoryResponse, ThroughputPoint, 
   EnergyConsumptionPoint, BatteryCostOfTrafficPoint,
-  EnergyPerBitPoint, SummaryMetricsResponse, SummaryMetrics
+  EnergyPerBitPoint, SummaryMetricsResponse, SummaryMetrics,
+  GRAPHS_HISTORY_ADAPTER
   )
+from supabase import Client
+from src.api.controller.db_controller import get_supabase
+from src.api.controller.etag_controller import build_etag, etag_matches
+from src.api.controller.response_cache import get_cached_response, cache_response
 from src.pipeline.data_ingestion import DataIngestion
 from src.pipeline.data_transformation import DataTransformation
-from src.api.controller.prediction_controller import safe_float
+from src.api.controller.prediction_controller import safe_float_col
 
 # Define router instance
 router = APIRouter()
 
+# Define function to build points from a metrics frame
+def build_points(model: Type[BaseModel], df: pd.DataFrame, fields: Dict[str, str]) -> List[BaseModel]:
+  '''
+  Function to turn metric columns into point models, replacing NaN/inf or missing columns with 0.0.
+  Values are already clean, so points are built with model_construct and skip validation.\n
+  params:
+  - model: Point model class.
+  - df: Metrics DataFrame with a created_at column.
+  - fields: Mapping of point field name to source column name.\n
+  returns:
+  - List of point models.
+  '''
+  names = list(fields)
+  columns = [
+    safe_float_col(df[col]).tolist() if col in df.columns else [0.0] * len(df)
+    for col in fields.values()
+  ]
+  return [
+    model.model_construct(timestamp=ts, **dict(zip(names, values)))
+    for ts, *values in zip(df["created_at"].tolist(), *columns)
+  ]
+
+# Define graph series: response key -> (point model, source column, point field -> column)
+GRAPH_SERIES: Dict[str, Tuple[Type[BaseModel], str, Dict[str, str]]] = {
+  "thr_points": (ThroughputPoint, "throughput_total_mbps", {
+    "throughput_total_mbps": "throughput_total_mbps",
+    "throughput_upload_mbps": "throughput_upload_mbps",
+    "throughput_download_mbps": "throughput_download_mbps"
+  }),
+  "energy_points": (EnergyConsumptionPoint, "energy_wh", {
+    "energy_wh": "energy_wh"
+  }),
+  "energy_per_bit_points": (EnergyPerBitPoint, "energy_per_bit_avg_J", {
+    "energy_per_bit_tx_J": "energy_per_bit_tx_J",
+    "energy_per_bit_rx_J": "energy_per_bit_rx_J",
+    "energy_per_bit_avg_J": "energy_per_bit_avg_J"
+  }),
+  "bot_points": (BatteryCostOfTrafficPoint, "BoT_mAh_per_Gbps", {
+    "bot_mAh_per_Gbps": "BoT_mAh_per_Gbps"
+  }),
+}
+
+# Rows without a timestamp cannot be placed on a graph; drop them in the database
+GRAPH_FILTERS = [("created_at", "not_null", None)]
+
+# Rows per chunk when streaming graph points
+STREAM_CHUNK_ROWS = 500
+
+# Define function to select the rows of one series
+def series_frame(df_metrics: pd.DataFrame, key: str) -> pd.DataFrame:
+  '''
+  Function to select the rows of a graph series, dropping rows without a value.\n
+  params:
+  - df_metrics: Metrics DataFrame sorted by created_at.
+  - key: Series key in GRAPH_SERIES.\n
+  returns:
+  - DataFrame of the series rows, empty if the source column is missing.
+  '''
+  _, source, _ = GRAPH_SERIES[key]
+  if source not in df_metrics.columns:
+    return df_metrics.iloc[0:0]
+  df_series = df_metrics.dropna(subset=[source])
+  # Negative throughput comes from counter resets
+  if key == "thr_points":
+    df_series = df_series[df_series[source] >= 0]
+  return df_series
+
 # Define throughput history route
 @router.get("/metrics", status_code=200, response_model=GraphsHistoryResponse)
 async def get_throughput_history(
+  request: Request,
+  response: Response,
   device_id: str = Query(..., description="Device ID"),
-  limit: int = Query(1000, ge=10, le=5000, description="Data fetch limit")) -> GraphsHistoryResponse:
+  limit: int = Query(1000, ge=10, le=5000, description="Data fetch limit"),
+  supabase: Client = Depends(get_supabase)) -> GraphsHistoryResponse:
   '''
   Function to retrieve throughput history for graph visualization.\n
   params:
@@ -33,8 +111,22 @@ async def get_throughput_history(
   
   '''
   try:
+    # Serve repeated polls from the short-lived response cache
+    cache_key = ("metrics", device_id, limit)
+    cached = get_cached_response(request, cache_key)
+    if cached is not None:
+      return cached
+    
     # Define data ingestion
-    df_raw = DataIngestion(table_name="raw_metrics", device_id=device_id).extract_data_from_db(limit=limit)
+    ingestion = DataIngestion(table_name="raw_metrics", device_id=device_id, supabase=supabase)
+    
+    # Return 304 when the client already has the latest data
+    etag = build_etag("graphs-metrics", device_id, limit, *await ingestion.aget_data_version())
+    if etag_matches(request, etag):
+      return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    
+    df_raw = await ingestion.aextract_data_from_db(limit=limit, order_by="created_at", filters=GRAPH_FILTERS)
     
     # Check if data is empty
     if df_raw.empty:
@@ -55,108 +147,102 @@ async def get_throughput_history(
         "energy_points": []
       }
     
-    # Create datetime column
-    df_metrics["created_at"] = pd.to_datetime(df_metrics["created_at"])
     df_metrics = df_metrics.sort_values("created_at")
     
-    # Prepare data points for throughput
-    if "throughput_total_mbps" in df_metrics.columns:
-      df_thr = df_metrics.dropna(subset=["throughput_total_mbps"])
-      df_thr = df_thr[df_thr["throughput_total_mbps"] >= 0]
-    else:
-      df_thr = pd.DataFrame()
-    
-    # Define throughput data points
-    thr_points = []
-    # Check if df_thr is not empty
-    if not df_thr.empty:
-      for _, row in df_thr.iterrows():
-        thr_points.append(
-          ThroughputPoint(
-            timestamp=row["created_at"],
-            throughput_total_mbps=safe_float(row["throughput_total_mbps"]),
-            throughput_upload_mbps=safe_float(row.get("throughput_upload_mbps", 0.0)),
-            throughput_download_mbps=safe_float(row.get("throughput_download_mbps", 0.0))
-          )
-        )
-    
-    # Define energy consumption data points
-    energy_points = []
-    # Check if energy_wh column exists
-    if "energy_wh" in df_metrics.columns:
-      df_energy = df_metrics.dropna(subset=["energy_wh"])
-      for _, row in df_energy.iterrows():
-        energy_points.append(
-          EnergyConsumptionPoint(
-            timestamp=row["created_at"],
-            energy_wh=safe_float(row["energy_wh"])
-          )
-        )
-    
-    # Define energy per bit data points
-    energy_per_bit_points = []
-    if "energy_per_bit_avg_J" in df_metrics.columns:
-      df_epb = df_metrics.dropna(subset=["energy_per_bit_avg_J"])
-      for _, row in df_epb.iterrows():
-        energy_per_bit_points.append(
-          EnergyPerBitPoint(
-            timestamp=row["created_at"],
-            energy_per_bit_tx_J=safe_float(row.get("energy_per_bit_tx_J", 0.0)),
-            energy_per_bit_rx_J=safe_float(row.get("energy_per_bit_rx_J", 0.0)),
-            energy_per_bit_avg_J=safe_float(row["energy_per_bit_avg_J"])
-          )
-        )
-    
-    # Define battery cost of traffic data points
-    bot_points = []
-    if "BoT_mAh_per_Gbps" in df_metrics.columns:
-      df_bot = df_metrics.dropna(subset=["BoT_mAh_per_Gbps"])
-      for _, row in df_bot.iterrows():
-        bot_points.append(
-          BatteryCostOfTrafficPoint(
-            timestamp=row["created_at"],
-            bot_mAh_per_Gbps=safe_float(row["BoT_mAh_per_Gbps"])
-          )
-        )
-    
-    # Return response
-    return {
-      "message": "Throughput history retrieved successfully",
-      "device_id": device_id,
-      "thr_points": thr_points,
-      "energy_points": energy_points,
-      "energy_per_bit_points": energy_per_bit_points,
-      "bot_points": bot_points
+    # Build data points for every series
+    points = {
+      key: build_points(model, series_frame(df_metrics, key), fields)
+      for key, (model, _, fields) in GRAPH_SERIES.items()
     }
+    
+    # Return response serialised once and cached
+    history = GraphsHistoryResponse.model_construct(
+      message="Throughput history retrieved successfully",
+      device_id=device_id,
+      **points
+    )
+    return cache_response(cache_key, etag, GRAPHS_HISTORY_ADAPTER.dump_json(history))
   except Exception as e:
     logging.error(f"Error in get_throughput_history: {e}")
     raise HTTPException(status_code=500, detail=str(e))
 
+# Define streaming graph history route for large windows
+@router.get("/metrics/stream", status_code=200)
+async def stream_throughput_history(
+  device_id: str = Query(..., description="Device ID"),
+  limit: int = Query(5000, ge=10, le=5000, description="Data fetch limit"),
+  supabase: Client = Depends(get_supabase)) -> StreamingResponse:
+  '''
+  Function to stream graph points as newline-delimited JSON.
+  The first line is a header; every other line is one point tagged with its series key.\n
+  params:
+  - device_id: Device ID to filter data.
+  - limit: Number of data points to retrieve.\n
+  returns:
+  - StreamingResponse with one JSON object per line.
+  '''
+  try:
+    ingestion = DataIngestion(table_name="raw_metrics", device_id=device_id, supabase=supabase)
+    df_raw = await ingestion.aextract_data_from_db(limit=limit, order_by="created_at", filters=GRAPH_FILTERS)
+    df_metrics = DataTransformation(data=df_raw).compute_metrics() if not df_raw.empty else pd.DataFrame()
+    if not df_metrics.empty:
+      df_metrics = df_metrics.sort_values("created_at")
+    
+    # Serialise chunk by chunk so the full payload is never held in memory
+    def iter_lines():
+      yield orjson.dumps({"message": "Throughput history retrieved successfully", "device_id": device_id}) + b"\n"
+      if df_metrics.empty:
+        return
+      for key, (_, _, fields) in GRAPH_SERIES.items():
+        df_series = series_frame(df_metrics, key)
+        for start in range(0, len(df_series), STREAM_CHUNK_ROWS):
+          chunk = df_series.iloc[start:start + STREAM_CHUNK_ROWS]
+          names = list(fields)
+          columns = [
+            safe_float_col(chunk[col]).tolist() if col in chunk.columns else [0.0] * len(chunk)
+            for col in fields.values()
+          ]
+          timestamps = [ts.isoformat() for ts in chunk["created_at"]]
+          yield b"".join(
+            orjson.dumps({"series": key, "timestamp": ts, **dict(zip(names, values))}) + b"\n"
+            for ts, *values in zip(timestamps, *columns)
+          )
+    
+    return StreamingResponse(iter_lines(), media_type="application/x-ndjson")
+  except Exception as e:
+    logging.error(f"Error in stream_throughput_history: {e}")
+    raise HTTPException(status_code=500, detail=str(e))
+
 # Define summary metrics route
 @router.get("/summary", status_code=200, response_model=SummaryMetricsResponse)
-async def get_summary_metrics(device_id: str = Query(..., description="Device ID")) -> SummaryMetricsResponse:
+async def get_summary_metrics(
+  request: Request,
+  response: Response,
+  device_id: str = Query(..., description="Device ID"),
+  supabase: Client = Depends(get_supabase)) -> SummaryMetricsResponse:
   try:
-    df_raw = DataIngestion(table_name="raw_metrics", device_id=device_id).extract_data_from_db()
-    # Check if df_raw is empty
-    if df_raw.empty:
-      return SummaryMetricsResponse(
-        message="No data found for the device",
-        device_id=device_id,
-        window_start=None,
-        window_end=None,
-        sample_last=0,
-        summary=None
-      )
+    # Serve repeated polls from the short-lived response cache
+    cache_key = ("summary", device_id)
+    cached = get_cached_response(request, cache_key)
+    if cached is not None:
+      return cached
     
-    # Compute metrics and summary
-    transformer = DataTransformation(data=df_raw)
-    summary_metrics = transformer.compute_monitoring_summary()
+    # Read the precomputed row from the device_summary materialized view
+    summary_view = DataIngestion(table_name="device_summary", device_id=device_id, supabase=supabase)
+    summary_df = await summary_view.aextract_data_from_db(limit=1, order_by="window_end")
     
-    summary_row = summary_metrics.loc[summary_metrics["device_id"] == device_id]
-    # Check if summary row is empty
-    if summary_row.empty:
+    # Version the response by the view row itself, which refreshes independently of raw_metrics
+    etag = build_etag("graphs-summary", device_id, *(summary_df.iloc[0].tolist() if not summary_df.empty else [None, 0]))
+    
+    # Return 304 when the client already has the latest summary
+    if etag_matches(request, etag):
+      return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    
+    # Check if summary_df is empty
+    if summary_df.empty:
       return SummaryMetricsResponse(
-        message="No summary metrics found for the device",
+        message="No data found for the device",
         device_id=device_id,
         window_start=None,
         window_end=None,
@@ -165,10 +251,10 @@ async def get_summary_metrics(device_id: str = Query(..., description="Device ID
       )
     
     # Get the first row as summary
-    summary = summary_row.iloc[0]
+    summary = summary_df.iloc[0]
     
     # Return metrics
-    return SummaryMetricsResponse(
+    summary_response = SummaryMetricsResponse(
       message="Summary metrics retrieved successfully",
       device_id=device_id,
       window_start=summary["window_start"],
@@ -182,6 +268,7 @@ async def get_summary_metrics(device_id: str = Query(..., description="Device ID
         energy_today_wh=summary["energy_today_wh"]
       )
     )
+    return cache_response(cache_key, etag, summary_response.model_dump_json().encode())
   except Exception as e:
     logging.error(f"Error in get_summary_metrics: {e}")
     raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -4,6 +4,7 @@ This module defines the API routes for calculating e-waste impact based on devic
 '''
 
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from src.api.controller.recommendation_controller import run_impact_calculation
 from src.api.model.impact_model import ImpactRequest, ImpactResponse
 
@@ -14,6 +15,7 @@ router = APIRouter()
 @router.post("/carbon-ewaste", response_model=ImpactResponse, summary="Calculate e-waste and carbon impact based on device parameters.")
 async def compute_carbon_ewaste_impact(payload: ImpactRequest) -> ImpactResponse:
   try:
-    return run_impact_calculation(payload)
+    # Run CPU-bound calculation off the event loop
+    return await run_in_threadpool(run_impact_calculation, payload)
   except Exception as e:
     raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
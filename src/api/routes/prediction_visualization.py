@@ -3,13 +3,23 @@ Route and logic for prediction endpoints
 '''
 import os
 import sys
+import asyncio
 
 from fastapi import APIRouter, HTTPException, Query
 from typing import List, Dict, Any
 
 from src.logging.logging import logging
-from src.api.model.prediction_model import PredictionResponse
-from src.api.controller.prediction_controller import run_prediction_pipeline
+from src.api.model.prediction_model import PredictionResponse, PredictionError, BatchPredictionResponse
+from src.api.controller.prediction_controller import (
+  FETCH_ROWS,
+  MAX_BATCH_DEVICES,
+  PREDICTION_EXECUTOR,
+  run_prediction_pipeline,
+  run_prediction_pipelines,
+  aget_prediction_cache_key,
+  is_prediction_cached
+)
+from src.api.controller.pool import get_pool, fetch_raw_metrics
 
 # Define router instance
 router = APIRouter()
@@ -18,7 +28,17 @@ router = APIRouter()
 @router.get("/soh", status_code=200, response_model=PredictionResponse)
 async def get_prediction(device_id: str = Query(..., description="Device ID")) -> PredictionResponse:
   try:
-    result = run_prediction_pipeline(device_id=device_id)
+    # Use the direct Postgres pool when available and no cached result exists
+    cache_key = await aget_prediction_cache_key(device_id)
+    df_raw = None
+    if get_pool() is not None and not is_prediction_cached(cache_key):
+      df_raw = await fetch_raw_metrics(device_id=device_id, limit=FETCH_ROWS, desc=False)
+    
+    # Run the CPU-bound pipeline on the prediction workers, as the batch route does
+    result = await asyncio.get_running_loop().run_in_executor(
+      PREDICTION_EXECUTOR,
+      lambda: run_prediction_pipeline(device_id=device_id, df_raw=df_raw, cache_key=cache_key)
+    )
     return PredictionResponse(
       message=result.message,
       device_id=result.device_id,
@@ -35,4 +55,35 @@ async def get_prediction(device_id: str = Query(..., description="Device ID")) -
     )
   except Exception as e:
     logging.error(f"Error in prediction endpoint: {e}")
-    raise HTTPException(status_code=500, detail=f"Error in prediction endpoint: {e}")
\ No newline at end of file
+    raise HTTPException(status_code=500, detail=f"Error in prediction endpoint: {e}")
+
+# Define multi-device prediction endpoint
+@router.get("/soh/batch", status_code=200, response_model=BatchPredictionResponse)
+async def get_predictions(
+  device_ids: List[str] = Query(..., max_length=MAX_BATCH_DEVICES, description="Device IDs")) -> BatchPredictionResponse:
+  try:
+    # Fetch through the Postgres pool when available, otherwise the pipeline reads from Supabase
+    fetch_raw = None
+    if get_pool() is not None:
+      fetch_raw = lambda device_id: fetch_raw_metrics(device_id=device_id, limit=FETCH_ROWS, desc=False)
+    
+    # Devices that fail, e.g. without enough data, are reported without failing the others
+    device_ids = list(dict.fromkeys(device_ids))
+    results = await run_prediction_pipelines(device_ids=device_ids, fetch_raw=fetch_raw)
+    predictions = [result for result in results if isinstance(result, PredictionResponse)]
+    errors = [
+      PredictionError(device_id=device_id, detail=str(result))
+      for device_id, result in zip(device_ids, results)
+      if isinstance(result, BaseException)
+    ]
+    for error in errors:
+      logging.error(f"Prediction failed for device {error.device_id}: {error.detail}")
+    
+    return BatchPredictionResponse(
+      message=f"Predicted {len(predictions)} of {len(device_ids)} devices",
+      predictions=predictions,
+      errors=errors
+    )
+  except Exception as e:
+    logging.error(f"Error in multi-device prediction endpoint: {e}")
+    raise HTTPException(status_code=500, detail=f"Error in multi-device prediction endpoint: {e}")
\ No newline at end of file
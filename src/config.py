@@ -0,0 +1,49 @@
+'''
+Module for shared application configuration
+'''
+
+import os
+import sys
+
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from dotenv import load_dotenv
+
+from src.exception.exception import CustomException
+
+# Define project base directory
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+# Define class for application configuration
+@dataclass(frozen=True)
+class AppConfig:
+  base_dir: Path
+  model_dir: Path
+  latest_model_dir: Path
+  image_model_dir: Path
+
+# Define function to load the application configuration once
+@lru_cache(maxsize=1)
+def get_config() -> AppConfig:
+  '''
+  Function to read .env once and resolve the model paths.\n
+  returns:
+  - AppConfig with the resolved directories.
+  '''
+  try:
+    load_dotenv(dotenv_path=BASE_DIR / ".env")
+    load_dotenv()
+    
+    model_dir = os.getenv("MODEL_DIR")
+    if not model_dir:
+      raise RuntimeError("MODEL_DIR is not set. Check your .env configuration.")
+    
+    return AppConfig(
+      base_dir=BASE_DIR,
+      model_dir=Path(model_dir),
+      latest_model_dir=Path(model_dir) / "latest",
+      image_model_dir=BASE_DIR / "notebooks" / "models" / "image" / "latest",
+    )
+  except Exception as e:
+    raise CustomException(e, sys)
\ No newline at end of file
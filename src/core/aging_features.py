@@ -7,6 +7,7 @@ based on battery usage data.
 import pandas as pd
 
 from .config import DEVICE_COL, TIMESTAMP_COL
+from .soh_cycles import attach_columns
 
 # Define function to compute aging features
 def add_aging_features(df: pd.DataFrame, win_fast: int = 6, win_slow: int = 48) -> pd.DataFrame:
@@ -19,50 +20,45 @@ def add_aging_features(df: pd.DataFrame, win_fast: int = 6, win_slow: int = 48)
   \nreturns:
   - DataFrame with additional aging feature columns.
   '''
-  try:
-    df = df.copy()
-    if "device_id" not in df.columns or "created_at" not in df.columns:
-      return df
-    df = df.sort_values([DEVICE_COL, TIMESTAMP_COL])
-
-    if "soh_smooth" in df.columns:
-      df["SoH_filled"] = df["soh_smooth"].ffill().bfill()
-    elif "soh_pct" in df.columns:
-      df["SoH_filled"] = (df["soh_pct"] / 100.0).ffill().bfill()
-    else:
-      df["SoH_filled"] = 0.0
-    
-    # Define per-device processing function
-    def _per_dev(g: pd.DataFrame) -> pd.DataFrame:
-      g = g.sort_values(TIMESTAMP_COL).copy()
-      g["soh_ema_fast"] = g["SoH_filled"].ewm(span=win_fast, adjust=False).mean()
-      g["soh_ema_slow"] = g["SoH_filled"].ewm(span=win_slow, adjust=False).mean()
-      g["soh_trend"] = g["soh_ema_fast"] - g["soh_ema_slow"]
-      g["efc_delta"] = g["EFC"].diff().fillna(0.0)
-      
-      # Temperature and throughput/energy EMA
-      if "batt_temp_c" in g.columns:
-        g["temp_ema"] = g["batt_temp_c"].ewm(span=win_fast, adjust=False).mean()
-        g["temp_max_win"] = g["batt_temp_c"].rolling(win_fast, min_periods=1).max()
-      else:
-        g["temp_ema"] = 0.0
-        g["temp_max_win"] = 0.0
-      
-      # Throughput and energy EMA
-      if "throughput_total_mbps" in g.columns:
-        g["tp_ema"] = g["throughput_total_mbps"].ewm(span=win_fast, adjust=False).mean()
-      else:
-        g["tp_ema"] = 0.0
-      
-      # Energy per bit EMA
-      if "energy_per_bit_avg_J" in g.columns:
-        g["epb_ema"] = g["energy_per_bit_avg_J"].ewm(span=win_fast, adjust=False).mean()
-      else:
-        g["epb_ema"] = 0.0
-      
-      return g
-    # Apply per-device processing
-    df = df.groupby(DEVICE_COL).apply(_per_dev).reset_index(drop=True)
+  df = df.copy()
+  if "device_id" not in df.columns or "created_at" not in df.columns:
     return df
-  except Exception as e:
-    print(f"Error in add_aging_features: {e}")
\ No newline at end of file
+  df = df.sort_values([DEVICE_COL, TIMESTAMP_COL], kind="mergesort")
+
+  if "soh_smooth" in df.columns:
+    df["SoH_filled"] = df["soh_smooth"].ffill().bfill()
+  elif "soh_pct" in df.columns:
+    df["SoH_filled"] = (df["soh_pct"] / 100.0).ffill().bfill()
+  else:
+    df["SoH_filled"] = 0.0
+  
+  # Group once; rows are already in (device, time) order
+  df = df.dropna(subset=[DEVICE_COL]).reset_index(drop=True)
+  gb = df.groupby(DEVICE_COL, sort=False, observed=True, group_keys=False)
+  
+  # Every fast EMA shares one span, so compute them in a single grouped ewm pass
+  fast_cols = [c for c in ("SoH_filled", "batt_temp_c", "throughput_total_mbps", "energy_per_bit_avg_J") if c in df.columns]
+  ema_fast = gb[fast_cols].ewm(span=win_fast, adjust=False).mean().reset_index(level=0, drop=True)
+  
+  # Collect the new columns and attach them in one concat
+  out = {}
+  out["soh_ema_fast"] = ema_fast["SoH_filled"]
+  out["soh_ema_slow"] = gb["SoH_filled"].ewm(span=win_slow, adjust=False).mean().reset_index(level=0, drop=True)
+  out["soh_trend"] = out["soh_ema_fast"] - out["soh_ema_slow"]
+  out["efc_delta"] = gb["EFC"].diff().fillna(0.0)
+  
+  # Temperature and throughput/energy EMA
+  if "batt_temp_c" in df.columns:
+    out["temp_ema"] = ema_fast["batt_temp_c"]
+    out["temp_max_win"] = gb["batt_temp_c"].rolling(win_fast, min_periods=1).max().reset_index(level=0, drop=True)
+  else:
+    out["temp_ema"] = 0.0
+    out["temp_max_win"] = 0.0
+  
+  # Throughput and energy EMA
+  out["tp_ema"] = ema_fast["throughput_total_mbps"] if "throughput_total_mbps" in df.columns else 0.0
+  
+  # Energy per bit EMA
+  out["epb_ema"] = ema_fast["energy_per_bit_avg_J"] if "energy_per_bit_avg_J" in df.columns else 0.0
+  df = attach_columns(df, out)
+  return df
\ No newline at end of file
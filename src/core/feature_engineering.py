@@ -4,14 +4,19 @@ This module includes functions for scaling, encoding, and transforming features
 to prepare data for machine learning models.
 '''
 
+import sys
+import threading
 import pandas as pd
 import numpy as np
 
-from .soh_cycles import calculate_soh_cycles
+from src.exception.exception import CustomException
+from src.logging.logging import logging
+from .soh_cycles import attach_columns, calculate_soh_cycles, map_nominal_capacity
 from .throughput_energy import calculate_throughput_energy_and_bot
 from .aging_features import add_aging_features
 from .config import DEVICE_COL, TIMESTAMP_COL
 
+from cachetools import LRUCache
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 from typing import List, Dict, Any, Tuple
 
@@ -31,6 +36,40 @@ AGING_BASE_COLS = [
   "epb_ema",
 ]
 
+# Define throughput/energy columns carried into the LSTM features
+TE_FEATURE_COLS = [
+  "throughput_total_bps",
+  "throughput_total_mbps",
+  "energy_wh",
+  "energy_per_bit_avg_J",
+  "BoT_mAh_per_Gbps",
+]
+
+# Cache of per-device SoH frames keyed by (device_id, last created_at, row count)
+SOH_CACHE: LRUCache = LRUCache(maxsize=512)
+SOH_CACHE_LOCK = threading.Lock()
+
+# Define function to compute SoH cycles for one device with caching
+def _cached_soh_cycles(g: pd.DataFrame) -> pd.DataFrame:
+  '''
+  Function to reuse the SoH frame of a device whose history has not changed since the last call.\n
+  params:
+  - g: Rows of a single device, sorted by timestamp.\n
+  returns:
+  - DataFrame from calculate_soh_cycles.
+  '''
+  key = (g[DEVICE_COL].iloc[0], g[TIMESTAMP_COL].iloc[-1], len(g))
+  with SOH_CACHE_LOCK:
+    cached = SOH_CACHE.get(key)
+  if cached is not None:
+    return cached.copy()
+  
+  soh = calculate_soh_cycles(g)
+  if soh is not None and not soh.empty:
+    with SOH_CACHE_LOCK:
+      SOH_CACHE[key] = soh
+  return soh
+
 # Define function to create LSTM features
 def make_lstm_features(df_raw: pd.DataFrame) -> pd.DataFrame:
   '''
@@ -41,58 +80,61 @@ def make_lstm_features(df_raw: pd.DataFrame) -> pd.DataFrame:
   - DataFrame with engineered features for LSTM models.
   '''
   try:
-    # SoH & cycles (per device)
-    soh_df = df_raw.groupby(DEVICE_COL, group_keys=False).apply(
-      calculate_soh_cycles
+    # Categorical device ids so every groupby below works on integer codes
+    devices = df_raw[DEVICE_COL].astype("category")
+    
+    # Nominal capacity for every row before any per-device work
+    df_raw = df_raw.assign(
+      C_nom_spec=map_nominal_capacity(devices),
+      **{DEVICE_COL: devices},
+      **{TIMESTAMP_COL: pd.to_datetime(df_raw[TIMESTAMP_COL], errors="coerce")},
     )
     
-    # Throughput + energy + epb + BoT
-    te_df = calculate_throughput_energy_and_bot(df_raw)
+    # Sort once so every device group arrives in time order and groups keep sorted order
+    df_raw = df_raw.sort_values([DEVICE_COL, TIMESTAMP_COL])
     
-    # Join sebaiknya pakai device_id + created_at
-    merged = pd.merge(
-      soh_df,
-      te_df[
-        [
-          DEVICE_COL,
-          TIMESTAMP_COL,
-          "throughput_total_bps",
-          "throughput_total_mbps",
-          "energy_wh",
-          "energy_per_bit_avg_J",
-          "BoT_mAh_per_Gbps",
-        ]
-      ],
-      on=[DEVICE_COL, TIMESTAMP_COL],
-      how="left",
-    )
+    # SoH & cycles (per device), relabelled so every row has a unique position
+    soh_df = df_raw.groupby(DEVICE_COL, sort=False, observed=True, group_keys=False).apply(
+      _cached_soh_cycles
+    ).reset_index(drop=True)
+    
+    # Throughput + energy + epb + BoT on the SoH frame itself, keeping its row labels
+    te_df = calculate_throughput_energy_and_bot(soh_df, keep_index=True)
+    
+    # Attach by position instead of merging on device_id + created_at; rows without throughput stay NaN
+    pos = te_df.index.to_numpy()
+    te_cols = {}
+    for col in TE_FEATURE_COLS:
+      values = np.full(len(soh_df), np.nan)
+      values[pos] = te_df[col].to_numpy(dtype=float)
+      te_cols[col] = values
+    merged = attach_columns(soh_df, te_cols)
     
     # Aging features buat LSTM
     feat = add_aging_features(merged)
     return feat
   except Exception as e:
-    print(f"Error in make_lstm_features: {e}")
+    logging.exception(f"Error in make_lstm_features: {e}")
+    raise CustomException(e, sys)
 
 # Function to add per-device z-score normalization
 def add_per_device_zscore(df, cols=AGING_BASE_COLS) -> pd.DataFrame:
-  try:
-    df = df.copy()
-    def _z_per_dev(g):
-      for c in cols:
-        if c not in g.columns:
-          continue
-        x = g[c].astype(float)
-        mu = x.mean()
-        sigma = x.std(ddof=0)
-        if sigma == 0 or np.isnan(sigma):
-          g[c + "_z"] = 0.0
-        else:
-          g[c + "_z"] = (x - mu) / sigma
-      return g
-    df = df.groupby("device_id", group_keys=False).apply(_z_per_dev)
+  df = df.dropna(subset=[DEVICE_COL]).copy()
+  cols = [c for c in cols if c in df.columns]
+  if not cols:
     return df
-  except Exception as e:
-    print(f"Error in add_per_device_zscore: {e}")
+  
+  # Per-device mean and population std in two grouped reductions
+  x = df[cols].astype(float)
+  gb = x.groupby(df[DEVICE_COL], sort=False, observed=True)
+  mu = gb.transform("mean")
+  sigma = gb.transform("std", ddof=0)
+  
+  # Constant (or all-NaN) columns of a device get z = 0
+  z = (x - mu) / sigma
+  z = z.mask((sigma == 0) | sigma.isna(), 0.0)
+  df[[c + "_z" for c in cols]] = z.to_numpy()
+  return df
 
 # Define function to build windows
 def build_windows(
@@ -110,40 +152,31 @@ def build_windows(
   returns:
   - Tuple of numpy arrays: (X_windows, y_targets, timestamps, soh_true_values).
   '''
-  try:
-    # Choose SoH true
-    if soh_true_col in df_feat.columns:
-      soh_true_series = df_feat[soh_true_col].astype(float) * 100.0
-    elif "SoH_pct" in df_feat.columns:
-      soh_true_series = df_feat["SoH_pct"].astype(float)
-    else:
-      raise ValueError("No valid SoH true column found.")
-    
-    # Define values
-    values = df_feat[feature_cols].values
-    n = len(values)
-    
-    # Define lists for windows
-    windows = []
-    timestamps = []
-    soh_true_list = []
-    efc_list = []
-    
-    # Create sliding windows
-    for i in range(win_size, n):
-      win = values[i - win_size : i]
-      windows.append(win)
-      timestamps.append(df_feat["created_at"].iloc[i])
-      soh_true_list.append(float(soh_true_series.iloc[i]))
-      efc_list.append(float(df_feat["EFC"].iloc[i]) if "EFC" in df_feat.columns else np.nan)
-    
-    # Create numpy arrays
-    X = np.array(windows, dtype=float)
-    timestamps = np.array(timestamps)
-    soh_true_arr = np.array(soh_true_list, dtype=float)
-    efc_arr = np.array(efc_list, dtype=float)
-    
-    # Return arrays
-    return X, timestamps, soh_true_arr, efc_arr
-  except Exception as e:
-    print(f"Error in build_windows: {e}")
\ No newline at end of file
+  # Choose SoH true column and its scale to percent
+  if soh_true_col in df_feat.columns:
+    soh_src, soh_scale = soh_true_col, 100.0
+  elif "SoH_pct" in df_feat.columns:
+    soh_src, soh_scale = "SoH_pct", 1.0
+  else:
+    raise ValueError("No valid SoH true column found.")
+  
+  # Define values; float32 is what the LSTM consumes, row-major so each window is contiguous
+  values = np.ascontiguousarray(df_feat[feature_cols].to_numpy(dtype=np.float32))
+  n = len(values)
+  if n <= win_size:
+    return np.array([], dtype=np.float32), np.array([]), np.array([], dtype=np.float32), np.array([], dtype=float)
+  
+  # Window i covers rows [i, i + win_size) and is labelled with row i + win_size
+  X = np.lib.stride_tricks.sliding_window_view(values, win_size, axis=0)[: n - win_size]
+  X = np.ascontiguousarray(X.transpose(0, 2, 1))
+  
+  # Labels are plain slices of the columns; only the labelled rows are converted
+  timestamps = df_feat[TIMESTAMP_COL].to_numpy()[win_size:n]
+  soh_true_arr = (df_feat[soh_src].to_numpy(dtype=float)[win_size:n] * soh_scale).astype(np.float32)
+  if "EFC" in df_feat.columns:
+    efc_arr = df_feat["EFC"].to_numpy(dtype=float)[win_size:n]
+  else:
+    efc_arr = np.full(n - win_size, np.nan)
+  
+  # Return arrays
+  return X, timestamps, soh_true_arr, efc_arr
\ No newline at end of file
@@ -1,12 +1,15 @@
 import numpy as np
 
 def create_sequences(df, feature_cols, window):
-    data = df[feature_cols].values
-    sequences = []
-    targets = []
+    # Row-major copy; DataFrame.to_numpy hands back column-major data for a single block
+    data = np.ascontiguousarray(df[feature_cols].to_numpy(dtype=np.float32))
+    n = max(len(data) - window, 0)
+    if n == 0:
+        return np.empty((0,), dtype=np.float32), np.empty((0,), dtype=np.float32)
     
-    for i in range(len(data) - window):
-        sequences.append(data[i:i+window])
-        targets.append(data[i+window])
+    # Sequence i is data[i:i+window], its target is data[i+window]
+    sequences = np.lib.stride_tricks.sliding_window_view(data, window, axis=0)[:n]
+    sequences = np.ascontiguousarray(sequences.transpose(0, 2, 1))
+    targets = data[window:window + n]
     
-    return np.array(sequences), np.array(targets)
\ No newline at end of file
+    return sequences, targets
\ No newline at end of file
@@ -9,6 +9,39 @@ import pandas as pd
 
 from .config import BATTERY_CAPACITY_SPEC, TIMESTAMP_COL, DEVICE_COL
 
+# Define nominal capacity lookup as a series for vectorized mapping
+CAPACITY_SERIES = pd.Series(BATTERY_CAPACITY_SPEC, dtype=float)
+
+# Define function to attach a batch of new columns at once
+def attach_columns(df: pd.DataFrame, out: dict) -> pd.DataFrame:
+  '''
+  Function to add many columns in one block insert instead of one assignment per column.\n
+  params:
+  - df: Dataframe to extend.
+  - out: Dictionary of column name to values (series, arrays or scalars).\n
+  returns:
+  - Dataframe with the columns attached; columns that already exist are overwritten in place.
+  '''
+  new = pd.DataFrame(out, index=df.index)
+  existing = new.columns.intersection(df.columns)
+  if len(existing):
+    df[existing] = new[existing]
+    new = new.drop(columns=existing)
+  return pd.concat([df, new], axis=1)
+
+# Define function to map devices to their nominal capacity
+def map_nominal_capacity(devices: pd.Series, capacity_map: dict = BATTERY_CAPACITY_SPEC) -> pd.Series:
+  '''
+  Function to look up the nominal capacity of every row in one vectorized pass.\n
+  params:
+  - devices: Series of device IDs.
+  - capacity_map: Dictionary mapping device IDs to their nominal battery capacities (in mAh).\n
+  returns:
+  - Float series of nominal capacities, NaN for unknown devices.
+  '''
+  cap = CAPACITY_SERIES if capacity_map is BATTERY_CAPACITY_SPEC else pd.Series(capacity_map, dtype=float)
+  return devices.map(cap).astype(float)
+
 # Define function to identify cycles using Hampel filter
 def _hampel(s: pd.Series, k: int = 7, nsigma: float = 5.0):
   '''
@@ -18,18 +51,15 @@ def _hampel(s: pd.Series, k: int = 7, nsigma: float = 5.0):
   - k: Window size parameter.
   - nsigma: Number of standard deviations to use as threshold.
   '''
-  try:
-    # Copy series
-    s = s.copy()
-    med = s.rolling(window=2 * k + 1, center=True, min_periods=3).median()
-    mad = (s - med).abs().rolling(window=2*k+1, center=True, min_periods=3).median()
-    thresh = nsigma * 1.4826 * mad
-    outlier = (s - med).abs() > thresh
-    s[outlier] = np.nan
-    return s
-  except Exception as e:
-    print(f"Error in _hampel: {e}")
-    return s
+  # Rolling median, then rolling MAD over the same absolute deviations
+  x = s.to_numpy(dtype=float)
+  med = s.rolling(window=2 * k + 1, center=True, min_periods=3).median().to_numpy()
+  dev = np.abs(x - med)
+  mad = pd.Series(dev).rolling(window=2 * k + 1, center=True, min_periods=3).median().to_numpy()
+  
+  # Blank out samples beyond nsigma robust deviations
+  out = np.where(dev > nsigma * 1.4826 * mad, np.nan, x)
+  return pd.Series(out, index=s.index, name=s.name)
 
 # Define function to compute SoH cycles
 def calculate_soh_cycles(
@@ -46,125 +76,125 @@ def calculate_soh_cycles(
   returns:
   - DataFrame with additional 'SoH' column representing State of Health cycles.
   '''
-  try:
-    # Copy and sort dataframe
-    df = df.copy()
+  # Copy and sort dataframe
+  df = df.copy()
+  if not pd.api.types.is_datetime64_any_dtype(df[TIMESTAMP_COL]):
     df[TIMESTAMP_COL] = pd.to_datetime(df[TIMESTAMP_COL], errors="coerce")
-    df = df.sort_values([DEVICE_COL, TIMESTAMP_COL]).reset_index(drop=True)
+  
+  # Skip the sort when a single device is already in time order
+  if df[DEVICE_COL].nunique() > 1 or not df[TIMESTAMP_COL].is_monotonic_increasing:
+    df = df.sort_values([DEVICE_COL, TIMESTAMP_COL])
+  df = df.reset_index(drop=True)
 
-    # delta_t per sample
-    df["delta_t_s"] = df.groupby(DEVICE_COL)[TIMESTAMP_COL].diff().dt.total_seconds()
-    df["delta_t_s"] = df["delta_t_s"].fillna(0)
-    df.loc[df["delta_t_s"] < 0, "delta_t_s"] = 0
-    df.loc[df["delta_t_s"] > 3600, "delta_t_s"] = 0
+  # Collect new columns and attach them in a single concat at the end
+  out = {}
+  
+  # delta_t per sample
+  delta_t_s = df.groupby(DEVICE_COL, observed=True)[TIMESTAMP_COL].diff().dt.total_seconds().fillna(0)
+  out["delta_t_s"] = delta_t_s.where((delta_t_s >= 0) & (delta_t_s <= 3600), 0.0)
 
-    # C_nom per device 
-    model = df[DEVICE_COL].iloc[0] if DEVICE_COL in df.columns else None
-    C_nom_spec = capacity_map.get(model) if model is not None else None
-    
-    # Check available data for SoH calculation
-    use_charge_counter = (
-      ("charge_counter_uah" in df.columns and df["charge_counter_uah"].notna().any())
-      or ("charge_counter" in df.columns and df["charge_counter"].notna().any())
-    )
-    use_current_avg = "current_avg_ua" in df.columns and df["current_avg_ua"].notna().any()
-    
-    if use_charge_counter:
-      if "charge_counter_uah" in df.columns:
-        raw = df["charge_counter_uah"]
-      else:
-        raw = df["charge_counter"] 
-      df["Q_mAh"] = pd.to_numeric(raw, errors="coerce") / 1000.0
-      df["Q_mAh_raw"] = df["Q_mAh"]
-      df["Q_mAh"] = _hampel(df["Q_mAh"], k=7, nsigma=5.0)
-        
-      # If median Q_mAh negatif, invert values
-      if df["Q_mAh"].dropna().median() < 0:
-        df["Q_mAh"] = -df["Q_mAh"]
-      
-    elif use_current_avg:
-      df["batt_current_a"] = df["current_avg_ua"] / 1e6
-      df["delta_Q_Ah"] = df["batt_current_a"] * df["delta_t_s"] / 3600.0
-      df["Q_Ah"] = df["delta_Q_Ah"].cumsum()
-      df["Q_Ah"] = df["Q_Ah"] - df["Q_Ah"].min()
-      df["Q_mAh"] = df["Q_Ah"] * 1000.0
+  # C_nom per row (precomputed by make_lstm_features when available)
+  if "C_nom_spec" in df.columns:
+    c_nom = df["C_nom_spec"]
+  elif DEVICE_COL in df.columns:
+    c_nom = out["C_nom_spec"] = map_nominal_capacity(df[DEVICE_COL], capacity_map)
+  else:
+    c_nom = out["C_nom_spec"] = pd.Series(np.nan, index=df.index)
+  C_nom_spec = float(c_nom.iloc[0]) if len(c_nom) and pd.notna(c_nom.iloc[0]) else None
+  
+  # Check available data for SoH calculation
+  use_charge_counter = (
+    ("charge_counter_uah" in df.columns and df["charge_counter_uah"].notna().any())
+    or ("charge_counter" in df.columns and df["charge_counter"].notna().any())
+  )
+  use_current_avg = "current_avg_ua" in df.columns and df["current_avg_ua"].notna().any()
+  
+  if use_charge_counter:
+    if "charge_counter_uah" in df.columns:
+      raw = df["charge_counter_uah"]
     else:
-      # Fallback if no data available
-      df["Q_mAh"] = np.nan
-      df["Ct_mAh"] = np.nan
-      df["SoH"] = np.nan
-      df["SoH_smooth"] = np.nan
-      df["SoH_pct"] = np.nan
-      df["SoH_smooth_pct"] = np.nan
-      df["delta_Q_mAh"] = np.nan
-      df["discharge_mAh"] = np.nan
-      df["EFC"] = np.nan
-      return df
-    
-    # Ct_mAh calculation
-    full_thresh = max(threshold - 1, 98)
-    df["battery_level"] = pd.to_numeric(df["battery_level"], errors="coerce")
-    df["is_full"] = (df["battery_level"] >= full_thresh).astype(int)
-    block_id = (df["is_full"].ne(df["is_full"].shift(1))).cumsum()
-    df["full_block_id"] = np.where(df["is_full"] == 1, block_id, np.nan)
-    df["Ct_mAh"] = np.nan
-    
-    # Calculate Ct_mAh per full charge block
-    if df["full_block_id"].notna().any():
-      grp = df.dropna(subset=["full_block_id", "Q_mAh"])
-      for bid, g in grp.groupby("full_block_id"):
-        q = g["Q_mAh"].dropna()
-        if q.empty:
-          continue
-        ct = np.nanpercentile(q, 95)
-        idx = q.idxmax()
-        df.loc[idx, "Ct_mAh"] = ct
+      raw = df["charge_counter"] 
+    q_raw = pd.to_numeric(raw, errors="coerce") / 1000.0
+    q = _hampel(q_raw, k=7, nsigma=5.0)
       
-    if df["Ct_mAh"].isna().all():
-      df["Ct_mAh"] = df["Q_mAh"].rolling(window=6, min_periods=3).max()
-    
-    if C_nom_spec is not None:
-      df["Ct_mAh"] = df["Ct_mAh"].clip(
-        lower=0.70 * C_nom_spec, upper=1.15 * C_nom_spec
-      )
-    df["Ct_mAh"] = df["Ct_mAh"].ffill()
-    
-    # C0_ref from data + spec
-    valid_ct = df["Ct_mAh"].dropna()
-    C0_ref_data = None
-    if not valid_ct.empty:
-      hi = np.nanpercentile(valid_ct, 99)
-      valid_ct = valid_ct[valid_ct <= hi]
-      C0_ref_data = float(np.percentile(valid_ct, 95))
-    
-    # Determine C0_ref
-    if C_nom_spec is not None and C0_ref_data is not None:
-      C0_ref = float(np.clip(C0_ref_data, 0.95 * C_nom_spec, 1.05 * C_nom_spec))
-    elif C0_ref_data is not None:
-      C0_ref = float(C0_ref_data)
-    elif C_nom_spec is not None:
-      C0_ref = float(C_nom_spec)
-    else:
-      C0_ref = float(default_C0)
-    
-    # SoH calculations
-    df["SoH"] = (df["Ct_mAh"] / C0_ref).clip(lower=0.0, upper=1.2)
-    df["SoH_smooth"] = (
-      df["SoH"].rolling(roll_win, min_periods=1, center=True).median()
-    )
-    df["SoH_pct"] = df["SoH"] * 100.0
-    df["SoH_smooth_pct"] = df["SoH_smooth"] * 100.0
-    
-    # EFC
-    df["delta_Q_mAh"] = df["Q_mAh"].diff().fillna(0)
-    df["discharge_mAh"] = np.where(df["delta_Q_mAh"] < 0, -df["delta_Q_mAh"], 0.0)
+    # If median Q_mAh negatif, invert values
+    if q.dropna().median() < 0:
+      q = -q
+    out["Q_mAh"] = q
+    out["Q_mAh_raw"] = q_raw
     
-    # Cap discharge_mAh at 99th percentile to avoid outliers
-    q99 = df["discharge_mAh"].quantile(0.99)
-    df.loc[df["discharge_mAh"] > q99, "discharge_mAh"] = q99
-    df["EFC"] = df["discharge_mAh"].cumsum() / C0_ref
+  elif use_current_avg:
+    out["batt_current_a"] = df["current_avg_ua"] / 1e6
+    out["delta_Q_Ah"] = out["batt_current_a"] * out["delta_t_s"] / 3600.0
+    q_ah = out["delta_Q_Ah"].cumsum()
+    out["Q_Ah"] = q_ah - q_ah.min()
+    q = out["Q_mAh"] = out["Q_Ah"] * 1000.0
+  else:
+    # Fallback if no data available
+    for col in (
+      "Q_mAh", "Ct_mAh", "SoH", "SoH_smooth", "SoH_pct",
+      "SoH_smooth_pct", "delta_Q_mAh", "discharge_mAh", "EFC",
+    ):
+      out[col] = np.nan
+    return attach_columns(df, out)
+  
+  # Ct_mAh calculation
+  full_thresh = max(threshold - 1, 98)
+  df["battery_level"] = pd.to_numeric(df["battery_level"], errors="coerce")
+  is_full = out["is_full"] = (df["battery_level"] >= full_thresh).astype(int)
+  block_id = (is_full.ne(is_full.shift(1))).cumsum()
+  full_block_id = out["full_block_id"] = block_id.where(is_full == 1)
+  ct = pd.Series(np.nan, index=df.index)
+  
+  # Calculate Ct_mAh per full charge block: 95th percentile placed at the block's max Q_mAh row
+  if full_block_id.notna().any():
+    valid = full_block_id.notna() & q.notna()
+    grp = q[valid].groupby(full_block_id[valid])
+    block_ct = grp.quantile(0.95)
+    block_idx = grp.idxmax()
+    ct.loc[block_idx.to_numpy()] = block_ct.loc[block_idx.index].to_numpy()
     
-    return df
-  except Exception as e:
-    print(f"Error in calculate_soh_cycles: {e}")
-    return pd.DataFrame()
\ No newline at end of file
+  if ct.isna().all():
+    ct = q.rolling(window=6, min_periods=3).max()
+  
+  if c_nom.notna().any():
+    ct = ct.clip(lower=0.70 * c_nom, upper=1.15 * c_nom)
+  ct = out["Ct_mAh"] = ct.ffill()
+  
+  # C0_ref from data + spec
+  valid_ct = ct.dropna()
+  C0_ref_data = None
+  if not valid_ct.empty:
+    hi = np.nanpercentile(valid_ct, 99)
+    valid_ct = valid_ct[valid_ct <= hi]
+    C0_ref_data = float(np.percentile(valid_ct, 95))
+  
+  # Determine C0_ref
+  if C_nom_spec is not None and C0_ref_data is not None:
+    C0_ref = float(np.clip(C0_ref_data, 0.95 * C_nom_spec, 1.05 * C_nom_spec))
+  elif C0_ref_data is not None:
+    C0_ref = float(C0_ref_data)
+  elif C_nom_spec is not None:
+    C0_ref = float(C_nom_spec)
+  else:
+    C0_ref = float(default_C0)
+  
+  # SoH calculations
+  out["SoH"] = (ct / C0_ref).clip(lower=0.0, upper=1.2)
+  out["SoH_smooth"] = (
+    out["SoH"].rolling(roll_win, min_periods=1, center=True).median()
+  )
+  out["SoH_pct"] = out["SoH"] * 100.0
+  out["SoH_smooth_pct"] = out["SoH_smooth"] * 100.0
+  
+  # EFC
+  delta_q = out["delta_Q_mAh"] = q.diff().fillna(0)
+  discharge = np.where(delta_q < 0, -delta_q, 0.0)
+  
+  # Cap discharge_mAh at 99th percentile to avoid outliers (np.quantile selects by partition, no sort)
+  if discharge.size:
+    discharge = np.minimum(discharge, np.quantile(discharge, 0.99))
+  out["discharge_mAh"] = discharge
+  out["EFC"] = np.cumsum(discharge) / C0_ref
+  
+  return attach_columns(df, out)
\ No newline at end of file
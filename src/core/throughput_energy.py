@@ -15,6 +15,13 @@ BETA_TX = 3.381132
 ALPHA_RX = 357.5443
 BETA_RX = 1.969068
 
+# Average tx/rx energy per bit in J/bit, with the 1e-9 scale and the 0.5 mean folded in
+EPB_AVG_ALPHA = (ALPHA_TX + ALPHA_RX) * 0.5e-9
+EPB_AVG_BETA = (BETA_TX + BETA_RX) * 0.5e-9
+
+# mAh per Gbps for 1 J/bit at 1 V
+BOT_SCALE = 8 * 1e9 * 1000.0 / 3600.0
+
 # Define base guard function
 def base_guard(df: pd.DataFrame) -> pd.DataFrame:
   '''
@@ -24,15 +31,55 @@ def base_guard(df: pd.DataFrame) -> pd.DataFrame:
   returns:
   - Validated and sorted dataframe.
   '''
-  try:
-    if df is None or df.empty:
-      return df
-    df = df.copy()
+  if df is None or df.empty:
+    return df
+  df = df.copy()
+  if not pd.api.types.is_datetime64_any_dtype(df[TIMESTAMP_COL]):
     df[TIMESTAMP_COL] = pd.to_datetime(df[TIMESTAMP_COL])
+  
+  # Skip the sort when a single device is already in time order
+  if df[DEVICE_COL].nunique() > 1 or not df[TIMESTAMP_COL].is_monotonic_increasing:
     df = df.sort_values([DEVICE_COL, TIMESTAMP_COL])
-    return df
-  except Exception as e:
-    print(f"Error in base_guard: {e}")
+  return df
+
+# Define function to compute per-device deltas on a guarded dataframe
+def _device_deltas(df: pd.DataFrame, cols: list) -> dict:
+  '''
+  Function to compute row-to-row differences of columns within each device in one vectorized pass.
+  Rows must already be sorted by device and timestamp; the first row of each device gets NaN,
+  like groupby().diff(). The timestamp column is returned in seconds.\n
+  params:
+  - df: Dataframe passed through base_guard.
+  - cols: Columns to difference.\n
+  returns:
+  - Dict of column name to numpy array of deltas.
+  '''
+  # Mark the first row of every device segment, comparing integer codes for categorical ids
+  dev = df[DEVICE_COL]
+  first = np.ones(len(df), dtype=bool)
+  if isinstance(dev.dtype, pd.CategoricalDtype):
+    codes = dev.cat.codes.to_numpy()
+    first[1:] = (codes[1:] != codes[:-1]) | (codes[1:] < 0)
+  else:
+    dev = dev.to_numpy()
+    first[1:] = (dev[1:] != dev[:-1]) | pd.isna(dev[1:])
+
+  deltas = {}
+  for col in cols:
+    if col == TIMESTAMP_COL:
+      ts = df[col]
+      ns = ts.to_numpy(dtype="datetime64[ns]").view("i8")
+      d = np.full(len(df), np.nan)
+      d[1:] = (ns[1:] - ns[:-1]) / 1e9
+      nat = ts.isna().to_numpy()
+      d[1:][nat[1:] | nat[:-1]] = np.nan
+    else:
+      values = df[col].to_numpy(dtype=float)
+      d = np.full(len(df), np.nan)
+      d[1:] = values[1:] - values[:-1]
+    d[first] = np.nan
+    deltas[col] = d
+  return deltas
 
 # Define function to compute throughput
 def calculate_throughput(df: pd.DataFrame) -> pd.DataFrame:
@@ -43,35 +90,39 @@ def calculate_throughput(df: pd.DataFrame) -> pd.DataFrame:
   returns:
   - DataFrame with additional throughput columns.
   '''
-  try:
-    # Apply base guard
-    df = base_guard(df)
-    if df is None or df.empty:
-      return df
+  # Apply base guard
+  df = base_guard(df)
+  if df is None or df.empty:
+    return df
+  return _throughput_impl(df)
 
-    # Calculate throughput
-    df = df.dropna(subset=["tx_total_bytes", "rx_total_bytes"])
-    df["delta_t"] = df.groupby(DEVICE_COL)[TIMESTAMP_COL].diff().dt.total_seconds()
-    df["delta_tx_bytes"] = df.groupby(DEVICE_COL)["tx_total_bytes"].diff()
-    df["delta_rx_bytes"] = df.groupby(DEVICE_COL)["rx_total_bytes"].diff()
+# Define throughput computation on an already guarded dataframe
+def _throughput_impl(df: pd.DataFrame) -> pd.DataFrame:
+  '''
+  Function to compute throughput columns on a dataframe already passed through base_guard.
+  '''
+  # Calculate throughput
+  df = df.dropna(subset=["tx_total_bytes", "rx_total_bytes"])
+  deltas = _device_deltas(df, [TIMESTAMP_COL, "tx_total_bytes", "rx_total_bytes"])
+  df["delta_t"] = deltas[TIMESTAMP_COL]
+  df["delta_tx_bytes"] = deltas["tx_total_bytes"]
+  df["delta_rx_bytes"] = deltas["rx_total_bytes"]
 
-    # Remove rows with non-positive delta_t or NaN values
-    df = df.dropna(subset=["delta_t", "delta_tx_bytes", "delta_rx_bytes"])
-    
-    # Calculate throughput in bps and Mbps
-    df["throughput_upload_bps"] = (df["delta_tx_bytes"] * 8) / df["delta_t"]
-    df["throughput_download_bps"] = (df["delta_rx_bytes"] * 8) / df["delta_t"]
-    df["throughput_total_bps"] = (
-      (df["delta_tx_bytes"] + df["delta_rx_bytes"]) * 8 / df["delta_t"]
-    )
+  # Remove rows with non-positive delta_t or NaN values
+  df = df.dropna(subset=["delta_t", "delta_tx_bytes", "delta_rx_bytes"])
+  
+  # Calculate throughput in bps and Mbps
+  df["throughput_upload_bps"] = (df["delta_tx_bytes"] * 8) / df["delta_t"]
+  df["throughput_download_bps"] = (df["delta_rx_bytes"] * 8) / df["delta_t"]
+  df["throughput_total_bps"] = (
+    (df["delta_tx_bytes"] + df["delta_rx_bytes"]) * 8 / df["delta_t"]
+  )
 
-    # Convert to Mbps
-    df["throughput_upload_mbps"] = df["throughput_upload_bps"] / 1e6
-    df["throughput_download_mbps"] = df["throughput_download_bps"] / 1e6
-    df["throughput_total_mbps"] = df["throughput_total_bps"] / 1e6
-    return df
-  except Exception as e:
-    print(f"Error in calculate_throughput: {e}")
+  # Convert to Mbps
+  df["throughput_upload_mbps"] = df["throughput_upload_bps"] / 1e6
+  df["throughput_download_mbps"] = df["throughput_download_bps"] / 1e6
+  df["throughput_total_mbps"] = df["throughput_total_bps"] / 1e6
+  return df
 
 # Define function to compute energy consumption
 def calculate_energy_consumption(df: pd.DataFrame) -> pd.DataFrame:
@@ -82,64 +133,64 @@ def calculate_energy_consumption(df: pd.DataFrame) -> pd.DataFrame:
   returns:
   - DataFrame with additional energy consumption columns.
   '''
-  try:
-    # Apply base guard
-    df = base_guard(df)
-    if df is None or df.empty:
-      return df
-    
-    # Calculate energy consumption
-    df["delta_t"] = df.groupby(DEVICE_COL)[TIMESTAMP_COL].diff().dt.total_seconds()
-    df["batt_voltage_v"] = df["batt_voltage_mv"] / 1000.0
-    df["batt_current_a"] = df["current_avg_ua"] / 1e6
-    df["energy_wh"] = (df["batt_voltage_v"] * df["batt_current_a"] * df["delta_t"]) / 3600.0
+  # Apply base guard
+  df = base_guard(df)
+  if df is None or df.empty:
     return df
-  except Exception as e:
-    print(f"Error in calculate_energy_consumption: {e}")
+  return _energy_impl(df)
+
+# Define energy computation on an already guarded dataframe
+def _energy_impl(df: pd.DataFrame) -> pd.DataFrame:
+  '''
+  Function to compute energy columns on a dataframe already passed through base_guard.
+  '''
+  # Calculate energy consumption
+  df["delta_t"] = _device_deltas(df, [TIMESTAMP_COL])[TIMESTAMP_COL]
+  df["batt_voltage_v"] = df["batt_voltage_mv"] / 1000.0
+  df["batt_current_a"] = df["current_avg_ua"] / 1e6
+  df["energy_wh"] = (df["batt_voltage_v"] * df["batt_current_a"] * df["delta_t"]) / 3600.0
+  return df
 
 # Define function to compute throughput, energy, and BoT
-def calculate_throughput_energy_and_bot(df: pd.DataFrame) -> pd.DataFrame:
+def calculate_throughput_energy_and_bot(df: pd.DataFrame, keep_index: bool = False) -> pd.DataFrame:
   '''
   Function to compute throughput, energy consumption, and Bits over Time (BoT).\n
   params:
-  - df: Input dataframe with battery usage data.\n
+  - df: Input dataframe with battery usage data.
+  - keep_index: Keep the input row labels on the output instead of a fresh range index.\n
   returns:
   - DataFrame with throughput, energy, and BoT metrics.
   '''
-  try:
-    df = base_guard(df)
-    if df is None or df.empty:
-      return df
-    
-    # Calculate throughput and energy
-    thr = calculate_throughput(df)
-    eng = calculate_energy_consumption(df)
-    
-    # Merge dataframes on device and timestamp
-    merged = pd.merge(
-      thr[[DEVICE_COL, TIMESTAMP_COL, "throughput_total_bps", "throughput_total_mbps"]],
-      eng[[DEVICE_COL, TIMESTAMP_COL, "batt_voltage_v", "energy_wh", "batt_temp_c"]],
-      on=[DEVICE_COL, TIMESTAMP_COL],
-      how="inner",
-    ).sort_values([DEVICE_COL, TIMESTAMP_COL])
-    
-    # Avoid division by zero
-    merged["throughput_total_bps"] = merged["throughput_total_bps"].replace(0, np.nan)
-    
-    # Calculate energy per bit (in Joules)
-    merged["energy_per_bit_tx"] = (ALPHA_TX / merged["throughput_total_bps"]) + BETA_TX
-    merged["energy_per_bit_rx"] = (ALPHA_RX / merged["throughput_total_bps"]) + BETA_RX
-    merged["energy_per_bit_tx_J"] = merged["energy_per_bit_tx"] * 1e-9
-    merged["energy_per_bit_rx_J"] = merged["energy_per_bit_rx"] * 1e-9
-    merged["energy_per_bit_avg_J"] = (
-      merged["energy_per_bit_tx_J"] + merged["energy_per_bit_rx_J"]
-    ) / 2
-    
-    # Calculate Bits over Time (BoT) in mAh per Gbps
-    V_avg = merged["batt_voltage_v"].mean()
-    merged["BoT_mAh_per_Gbps"] = (
-      merged["energy_per_bit_avg_J"] * (8 * 1e9) / V_avg
-    ) * (1000.0 / 3600.0)
-    return merged
-  except Exception as e:
-    print(f"Error in calculate_throughput_energy_and_bot: {e}")
\ No newline at end of file
+  df = base_guard(df)
+  if df is None or df.empty:
+    return df
+  
+  # Calculate throughput and energy on the same guarded frame, labelled by position
+  labels = df.index
+  df = df.reset_index(drop=True)
+  thr = _throughput_impl(df)
+  eng = _energy_impl(df)
+  
+  # Throughput rows are a subset of the energy rows, so their labels index straight into it
+  pos = thr.index.to_numpy()
+  merged = thr[[DEVICE_COL, TIMESTAMP_COL, "throughput_total_bps", "throughput_total_mbps"]].reset_index(drop=True)
+  for col in ("batt_voltage_v", "energy_wh", "batt_temp_c"):
+    merged[col] = eng[col].to_numpy()[pos]
+  if keep_index:
+    merged.index = labels[pos]
+  
+  # Avoid division by zero
+  tbps = merged["throughput_total_bps"].to_numpy(dtype=float)
+  tbps = np.where(tbps == 0, np.nan, tbps)
+  merged["throughput_total_bps"] = tbps
+  
+  # Calculate energy per bit (in Joules) as fused numpy expressions
+  merged["energy_per_bit_tx_J"] = (ALPHA_TX / tbps + BETA_TX) * 1e-9
+  merged["energy_per_bit_rx_J"] = (ALPHA_RX / tbps + BETA_RX) * 1e-9
+  epb_avg = EPB_AVG_ALPHA / tbps + EPB_AVG_BETA
+  merged["energy_per_bit_avg_J"] = epb_avg
+  
+  # Calculate Bits over Time (BoT) in mAh per Gbps
+  V_avg = merged["batt_voltage_v"].mean()
+  merged["BoT_mAh_per_Gbps"] = epb_avg * (BOT_SCALE / V_avg)
+  return merged
\ No newline at end of file
@@ -3,26 +3,57 @@ Data ingestion module for handling data operations with Supabase database.
 '''
 
 import sys
+import asyncio
 import pandas as pd
 
+from typing import Any, List, Tuple
+from supabase import Client
+
 from src.api.controller.db_controller import create_supabase_connection
+from src.api.controller.pool import get_pool, fetch_table_rows, fetch_table_version
 from src.exception.exception import CustomException
 from src.logging.logging import logging
-from src.api.model.raw_metrics import RawMetrics
+
+# Timestamp columns parsed once at ingestion
+TIMESTAMP_COLS = ("created_at", "ts_utc")
+
+# Define function to parse timestamp columns
+def parse_timestamps(df: pd.DataFrame) -> pd.DataFrame:
+  '''
+  Function to parse timestamp columns once as datetime64[ns, UTC] so routes do not re-parse them.
+  '''
+  for col in TIMESTAMP_COLS:
+    if col in df.columns:
+      df[col] = pd.to_datetime(df[col], utc=True, errors="coerce", format="ISO8601")
+  return df
 
 # Define data ingestion class
 class DataIngestion:
-  def __init__(self, table_name:str, device_id:str | None = None):
+  def __init__(self, table_name:str, device_id:str | None = None, supabase: Client | None = None):
     self.table_name = table_name
     self.device_id = device_id
-    self.supabase = create_supabase_connection()
+    self._supabase = supabase
+  
+  @property
+  def supabase(self) -> Client:
+    '''
+    Supabase client, created on first use so pool-backed reads never build it.
+    '''
+    if self._supabase is None:
+      self._supabase = create_supabase_connection()
+    return self._supabase
   
-  def extract_data_from_db(self, limit: int = 200) -> pd.DataFrame:
+  def extract_data_from_db(
+    self, limit: int = 200, order_by: str = "ts_utc", desc: bool = True,
+    columns: List[str] | None = None, filters: List[Tuple[str, str, Any]] | None = None) -> pd.DataFrame:
     '''
     Function to extract data from Supabase database table.
     \nparams:
-    - table_name: Name of the table to extract data from.
-    - deivice_id: Device ID to filter the data.
+    - limit: Maximum number of rows to fetch.
+    - order_by: Column used to order rows in the database.
+    - desc: Whether to order descending (latest rows first).
+    - columns: Optional list of columns to select; all columns when None.
+    - filters: Optional (column, op, value) row filters; op is eq/gt/gte/lt/lte or "not_null".
     \nreturns:
     - DataFrame containing the extracted data.
     '''
@@ -31,16 +62,88 @@ class DataIngestion:
       logging.info(f"Extracting data from table: {self.table_name}...")
       response = (
         self.supabase.table(self.table_name)
-        .select("*")
-        .order("ts_utc", desc=True))
+        .select(",".join(columns) if columns else "*")
+        .order(order_by, desc=desc))
       
       # Check for device_id filter
       if self.device_id:
         response = response.eq("device_id", self.device_id)
+      
+      # Apply row filters in the database
+      for col, op, value in filters or []:
+        if op == "not_null":
+          response = response.not_.is_(col, "null")
+        else:
+          response = getattr(response, op)(col, value)
       response = response.limit(limit).execute()
       
       result = response.data
       logging.info("Data extraction completed successfully.")
-      return pd.DataFrame(result)
+      if not result:
+        return parse_timestamps(pd.DataFrame(columns=columns))
+      return parse_timestamps(pd.DataFrame.from_records(result, columns=columns))
+    except Exception as e:
+      raise CustomException(e, sys)
+  
+  async def aextract_data_from_db(
+    self, limit: int = 200, order_by: str = "ts_utc", desc: bool = True,
+    columns: List[str] | None = None, filters: List[Tuple[str, str, Any]] | None = None) -> pd.DataFrame:
+    '''
+    Function to extract data without blocking the event loop.
+    Uses the asyncpg pool when configured, otherwise runs the Supabase query in a worker thread.
+    \nparams:
+    - limit: Maximum number of rows to fetch.
+    - order_by: Column used to order rows in the database.
+    - desc: Whether to order descending (latest rows first).
+    - columns: Optional list of columns to select; all columns when None.
+    - filters: Optional (column, op, value) row filters; op is eq/gt/gte/lt/lte or "not_null".
+    \nreturns:
+    - DataFrame containing the extracted data.
+    '''
+    try:
+      if get_pool() is None:
+        return await asyncio.to_thread(self.extract_data_from_db, limit, order_by, desc, columns, filters)
+      
+      logging.info(f"Extracting data from table through pool: {self.table_name}...")
+      df = await fetch_table_rows(
+        self.table_name, device_id=self.device_id, limit=limit, order_by=order_by, desc=desc,
+        columns=columns, filters=filters
+      )
+      return parse_timestamps(df)
+    except Exception as e:
+      raise CustomException(e, sys)
+  
+  def get_data_version(self) -> tuple:
+    '''
+    Function to get a cheap version marker of the table for cache keys.
+    \nreturns:
+    - Tuple of (latest ts_utc, row count).
+    '''
+    try:
+      response = (
+        self.supabase.table(self.table_name)
+        .select("ts_utc", count="exact")
+        .order("ts_utc", desc=True))
+      
+      # Check for device_id filter
+      if self.device_id:
+        response = response.eq("device_id", self.device_id)
+      response = response.limit(1).execute()
+      
+      last_ts = response.data[0]["ts_utc"] if response.data else None
+      return last_ts, response.count
+    except Exception as e:
+      raise CustomException(e, sys)
+  
+  async def aget_data_version(self) -> tuple:
+    '''
+    Function to get the table version marker without blocking the event loop.
+    \nreturns:
+    - Tuple of (latest ts_utc, row count).
+    '''
+    try:
+      if get_pool() is None:
+        return await asyncio.to_thread(self.get_data_version)
+      return await fetch_table_version(self.table_name, device_id=self.device_id, ts_col="ts_utc")
     except Exception as e:
       raise CustomException(e, sys)
\ No newline at end of file
@@ -6,17 +6,31 @@ import os
 import sys
 import pandas as pd
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from src.exception.exception import CustomException
 from src.logging.logging import logging
 from src.api.controller.db_controller import create_supabase_connection
 from src.pipeline.data_transformation import DataTransformation
 
+# Define upsert batching constants
+UPSERT_CHUNK_ROWS = 5000
+UPSERT_WORKERS = 4
+
 # Define data load class
 class DataLoad:
   def __init__(self, target_table:str):
     self.supabase = create_supabase_connection()
     self.target_table = target_table
   
+  def _upsert_chunk(self, chunk: pd.DataFrame) -> None:
+    '''
+    Function to upsert one chunk of rows to the target table.
+    \nparams:
+    - chunk: DataFrame slice to be loaded.
+    '''
+    records = chunk.to_dict(orient="records")
+    self.supabase.table(self.target_table).upsert(records).execute()
+  
   def load_data_to_db(self, df: pd.DataFrame) -> pd.DataFrame | None:
     '''
     Function to load data to Supabase database table.
@@ -33,7 +47,15 @@ class DataLoad:
       
       # Load data to specified table
       logging.info(f"Loading data to table: {self.target_table}...")
-      records = df.to_dict(orient="records")
-      self.supabase.table(self.target_table).upsert(records).execute()
+      
+      # Serialize and upsert in chunks so requests overlap and peak memory stays bounded
+      with ThreadPoolExecutor(max_workers=UPSERT_WORKERS, thread_name_prefix="upsert") as executor:
+        futures = [
+          executor.submit(self._upsert_chunk, df.iloc[start:start + UPSERT_CHUNK_ROWS])
+          for start in range(0, len(df), UPSERT_CHUNK_ROWS)
+        ]
+        for future in as_completed(futures):
+          future.result()
+      return df
     except Exception as e:
       raise CustomException(e, sys)
\ No newline at end of file
@@ -15,10 +15,48 @@ from src.service.usage_calculation import UsageCalculation
 from src.utils.utils import add_aging_features, calculate_soh_and_cycles
 from src.core.feature_engineering import add_per_device_zscore
 
+# Intermediate throughput columns no consumer of compute_metrics reads
+THROUGHPUT_SCRATCH_COLS = [
+  "delta_t", "delta_tx_bytes", "delta_rx_bytes",
+  "throughput_upload_bps", "throughput_download_bps", "throughput_total_bps",
+]
+
+# Columns every metrics computation groups and orders by
+REQUIRED_COLS = {"device_id", "created_at"}
+
 # Define data transformation class
 class DataTransformation:
   def __init__(self, data: pd.DataFrame):
     self.data = data
+    self._cache: dict = {}
+    self._calc: MetricsCalculation | None = None
+  
+  def _get_calc(self) -> MetricsCalculation:
+    '''
+    Function to get the MetricsCalculation wrapping self.data, created once per instance.
+    '''
+    if self._calc is None:
+      self._calc = MetricsCalculation(df=self.data)
+    return self._calc
+  
+  def _has_required_input(self) -> bool:
+    '''
+    Function to check that self.data is non-empty and has the device_id and created_at columns.
+    '''
+    return self.data is not None and not self.data.empty and REQUIRED_COLS.issubset(self.data.columns)
+  
+  def _memo(self, key: str, fn):
+    '''
+    Function to run a computation once per instance and reuse its result afterwards.\n
+    params:
+    - key : str : Cache key of the computation
+    - fn : callable : Zero-argument function producing the result\n
+    returns:
+    - Result of fn, computed on the first call only
+    '''
+    if key not in self._cache:
+      self._cache[key] = fn()
+    return self._cache[key]
   
   def compute_throughput(self) -> pd.DataFrame:
     '''
@@ -27,8 +65,7 @@ class DataTransformation:
     try:
       # Perform data transformation equation
       logging.info("Transforming data...")
-      throughput_data = MetricsCalculation(df=self.data)
-      throughput_df = throughput_data.calculate_throughput()
+      throughput_df = self._memo("throughput", lambda: self._get_calc().calculate_throughput())
       
       logging.info("Troughput calculation completed successfully.")
       return throughput_df
@@ -42,8 +79,7 @@ class DataTransformation:
     try:
       # Perform energy computation
       logging.info("Computing energy consumption...")
-      energy_data = MetricsCalculation(df=self.data)
-      energy_df = energy_data.calculate_energy_consumption()
+      energy_df = self._memo("energy", lambda: self._get_calc().calculate_energy_consumption())
       
       logging.info("Energy consumption calculation completed successfully.")
       return energy_df
@@ -57,8 +93,7 @@ class DataTransformation:
     try:
       # Perform throughput based energy computation
       logging.info("Computing throughput based energy consumption and battery cost of traffic...")
-      bot_data = MetricsCalculation(df=self.data)
-      bot_df = bot_data.calculate_throughput_energy_and_bot()
+      bot_df = self._memo("bot", lambda: self._get_calc().calculate_throughput_energy_and_bot())
       
       logging.info("Throughput based energy consumption and battery cost of traffic calculation completed successfully.")
       return bot_df
@@ -72,8 +107,7 @@ class DataTransformation:
     try:
       # Perform battery cycles computation
       logging.info("Computing battery cycles...")
-      cycles_data = MetricsCalculation(df=self.data)
-      cycles_df = cycles_data.calculate_battery_cycles()
+      cycles_df = self._memo("cycles", lambda: self._get_calc().calculate_battery_cycles())
       
       logging.info("Battery cycles calculation completed successfully.")
       return cycles_df
@@ -87,8 +121,7 @@ class DataTransformation:
     try:
       # Perform SoH computation
       logging.info("Computing State of Health (SoH)...")
-      soh_data = MetricsCalculation(df=self.data)
-      soh_df = soh_data.calculate_soh()
+      soh_df = self._memo("soh", lambda: self._get_calc().calculate_soh())
       
       logging.info("State of Health (SoH) calculation completed successfully.")
       return soh_df
@@ -120,14 +153,19 @@ class DataTransformation:
     - pd.DataFrame : DataFrame containing all computed metrics
     '''
     try:
-      raw = self.data
-      if raw is None or raw.empty:
-        logging.warning("Input data is empty in compute_metrics().")
+      # Reuse the merged metrics when this instance already computed them
+      if "metrics" in self._cache:
+        return self._cache["metrics"]
+      
+      # Skip every calculation on empty input or input without the grouping keys
+      if not self._has_required_input():
+        logging.warning("Input data is empty or missing device_id/created_at in compute_metrics().")
         return pd.DataFrame()
       
-      # Ensure created_at is datetime and sort values
-      raw = raw.copy()
-      raw["created_at"] = pd.to_datetime(raw["created_at"], errors="coerce")
+      # Ensure created_at is datetime (already parsed at ingestion) and sort values
+      raw = self.data.copy()
+      if not pd.api.types.is_datetime64_any_dtype(raw["created_at"]):
+        raw["created_at"] = pd.to_datetime(raw["created_at"], errors="coerce")
       raw = raw.dropna(subset=["created_at"])
       raw = raw.sort_values(["device_id", "created_at"])
       
@@ -180,45 +218,38 @@ class DataTransformation:
         logging.warning("All computed dataframes are empty. Returning empty dataframe.")
         return pd.DataFrame()
       
-      # Start merging from the first non-empty dataframe
-      merged = non_empty[0].copy()
-      
-      # Merge throughput
-      if energy_df is not None and not energy_df.empty:
-        logging.info("Merging energy data...")
-        merged = merged.merge(
-          energy_df[["device_id", "created_at", "energy_wh", "batt_voltage_v"]],
-          on=["device_id", "created_at"],
-          how="left",
-        )
+      # Start from the first non-empty dataframe and index it once on the join keys
+      keys = ["device_id", "created_at"]
+      base = non_empty[0].drop(columns=THROUGHPUT_SCRATCH_COLS, errors="ignore")
       
-      # Merge energy per bit & BoT
-      if energy_bot_df is not None and not energy_bot_df.empty:
-        logging.info("Merging energy_per_bit & BoT data...")
-        merged = merged.merge(
-          energy_bot_df[["device_id", "created_at", "energy_per_bit_tx_J", "energy_per_bit_rx_J", "energy_per_bit_avg_J", "BoT_mAh_per_Gbps"]],
-          on=["device_id", "created_at"],
-          how="left",
-        )
+      # Right-hand frames and the columns each contributes, joined in a single pass
+      parts = []
+      for frame, cols, label in (
+        (energy_df, ["energy_wh", "batt_voltage_v"], "energy"),
+        (energy_bot_df, ["energy_per_bit_tx_J", "energy_per_bit_rx_J", "energy_per_bit_avg_J", "BoT_mAh_per_Gbps"], "energy_per_bit & BoT"),
+        (cycles_df, ["Q_mAh", "delta_Q_mAh", "discharge_mAh", "EFC"], "cycles (Q_mAh, EFC, ...)"),
+        (soh_df, ["SoH", "SoH_smooth", "SoH_pct", "SoH_smooth_pct", "SoH_filled", "Ct_mAh"], "SoH"),
+      ):
+        if frame is None or frame.empty or frame is non_empty[0]:
+          continue
+        logging.info(f"Merging {label} data...")
+        parts.append(frame.set_index(keys)[cols])
       
-      # Merge cycles data
-      if cycles_df is not None and not cycles_df.empty:
-        logging.info("Merging cycles data (Q_mAh, EFC, ...)...")
-        merged = merged.merge(
-          cycles_df[["device_id", "created_at", "Q_mAh", "delta_Q_mAh", "discharge_mAh", "EFC"]],
-          on=["device_id", "created_at"],
-          how="left",
+      if parts and all(part.index.is_unique for part in parts):
+        # Look every part up on the base keys and stitch the columns together once
+        target = pd.MultiIndex.from_frame(base[keys])
+        merged = pd.concat(
+          [base.reset_index(drop=True)] + [part.reindex(target).reset_index(drop=True) for part in parts],
+          axis=1,
         )
+      else:
+        # Duplicate keys need merge semantics (one row per match)
+        merged = base.copy()
+        for part in parts:
+          merged = merged.merge(part.reset_index(), on=keys, how="left")
       
-      # Merge SoH data
+      # SoH derived features
       if soh_df is not None and not soh_df.empty:
-        logging.info("Merging SoH data...")
-        merged = merged.merge(
-          soh_df[["device_id", "created_at", "SoH", "SoH_smooth", "SoH_pct", "SoH_smooth_pct", "SoH_filled", "Ct_mAh"]],
-          on=["device_id", "created_at"],
-          how="left",
-        )
-        
         # Alias for old schema
         if "SoH_pct" in merged.columns and "soh_pct" not in merged.columns:
           merged["soh_pct"] = merged["SoH_pct"]
@@ -235,6 +266,7 @@ class DataTransformation:
       
       logging.info("Metrics computation completed successfully.")
       logging.info(f"Merged DataFrame columns: {merged.columns.tolist()}")
+      self._cache["metrics"] = merged
       return merged
     except Exception as e:
       raise CustomException(e, sys)
@@ -248,6 +280,11 @@ class DataTransformation:
     - pd.DataFrame : DataFrame containing monitoring summary
     '''
     try:
+      # Check input before computing any metrics
+      if not self._has_required_input():
+        logging.error("Input data is empty or missing device_id/created_at in compute_monitoring_summary().")
+        return pd.DataFrame()
+      
       logging.info("Computing monitoring summary...")
       metrics_df = self.compute_metrics()
       
@@ -255,57 +292,59 @@ class DataTransformation:
       if metrics_df is None or metrics_df.empty:
         return pd.DataFrame()
       
-      # Copy metrics_df to summary_df
-      df = metrics_df.copy()
+      # Project the summary inputs, then convert types and sort once
+      summary_cols = ["device_id", "created_at", "energy_wh", "throughput_total_mbps", "BoT_mAh_per_Gbps", "energy_per_bit_avg_J"]
+      df = metrics_df[[c for c in summary_cols if c in metrics_df.columns]].copy()
+      if not pd.api.types.is_datetime64_any_dtype(df["created_at"]):
+        df["created_at"] = pd.to_datetime(df["created_at"], cache=True) # Ensure created_at is in datetime format
+      device_dtype = df["device_id"].dtype
+      df["device_id"] = df["device_id"].astype("category")
+      df = df.sort_values(["device_id", "created_at"], kind="stable")
       
-      # Check if created_at column exists
-      if "created_at" not in df.columns:
-        logging.error("created_at column is missing in the data.")
-        return pd.DataFrame()
-      df["created_at"] = pd.to_datetime(df["created_at"]) # Ensure created_at is in datetime format
-      df = df.sort_values(by="created_at") # Sort by created_at
+      # Per-row window bounds from each device's latest sample
+      created = df["created_at"]
+      last_time = df.groupby("device_id", observed=True)["created_at"].transform("max")
+      in_window = (created > last_time - pd.Timedelta(hours=window_hours)) & (created <= last_time)
+      in_today = (created >= last_time.dt.normalize()) & (created <= last_time)
       
-      # Create list of summary metrics
-      summary: list = []
-      for dev, g in df.groupby("device_id"):
-        if g.empty:
-          continue
-        g = g.sort_values(by="created_at")
-        last_time = g["created_at"].max()
-        
-        # Create window for summary calculation
-        window_start = last_time - pd.Timedelta(hours=window_hours)
-        window_data = g[(g["created_at"] > window_start) & (g["created_at"] <= last_time)]
-        if window_data.empty:
-          continue
-        
-        # Today summary
-        day_start = last_time.normalize()
-        today_mask = (g["created_at"] >= day_start) & (g["created_at"] <= last_time)
-        today = g.loc[today_mask]
-        
-        # Append summary metrics to list
-        summary.append({
-          "device_id": dev,
-          "window_start": window_start,
-          "window_end": last_time,
-          "sample_last": len(window_data),
-          
-          # Last 1 hour metrics
-          "energy_last_wh": window_data["energy_wh"].sum(skipna=True) 
-          if "energy_wh" in window_data.columns else np.nan,
-          "avg_thr_last_mbps": window_data["throughput_total_mbps"].mean(skipna=True) 
-          if "throughput_total_mbps" in window_data.columns else np.nan,
-          "avg_bot_last": window_data["BoT_mAh_per_Gbps"].mean(skipna=True)
-          if "BoT_mAh_per_Gbps" in window_data.columns else np.nan,
-          "avg_epb_last": window_data["energy_per_bit_avg_J"].mean(skipna=True)
-          if "energy_per_bit_avg_J" in window_data.columns else np.nan,
-          
-          # Total energy today
-          "energy_today_wh": today["energy_wh"].sum(skipna=True)
-          if (not today.empty and "energy_wh" in today.columns) else np.nan,
+      # Mask each metric to its window, then aggregate every device in one groupby
+      def masked(col: str, mask: pd.Series) -> pd.Series:
+        return df[col].where(mask) if col in df.columns else pd.Series(np.nan, index=df.index)
+      
+      summary_df = (
+        pd.DataFrame({
+          "device_id": df["device_id"],
+          "created_at": created,
+          "in_window": in_window,
+          "energy_last_wh": masked("energy_wh", in_window),
+          "avg_thr_last_mbps": masked("throughput_total_mbps", in_window),
+          "avg_bot_last": masked("BoT_mAh_per_Gbps", in_window),
+          "avg_epb_last": masked("energy_per_bit_avg_J", in_window),
+          "energy_today_wh": masked("energy_wh", in_today),
         })
-      summary_df = pd.DataFrame(summary)
+        .groupby("device_id", observed=True)
+        .agg(
+          window_end=("created_at", "max"),
+          sample_last=("in_window", "sum"),
+          energy_last_wh=("energy_last_wh", "sum"),
+          avg_thr_last_mbps=("avg_thr_last_mbps", "mean"),
+          avg_bot_last=("avg_bot_last", "mean"),
+          avg_epb_last=("avg_epb_last", "mean"),
+          energy_today_wh=("energy_today_wh", "sum"),
+        )
+      )
+      
+      # Devices without samples in the window are left out
+      summary_df = summary_df[summary_df["sample_last"] > 0].reset_index()
+      if summary_df.empty:
+        summary_df = pd.DataFrame()
+      else:
+        summary_df["device_id"] = summary_df["device_id"].astype(device_dtype)
+        summary_df.insert(1, "window_start", summary_df["window_end"] - pd.Timedelta(hours=window_hours))
+        
+        # Energy sums stay NaN rather than zero when the source column is missing
+        if "energy_wh" not in df.columns:
+          summary_df[["energy_last_wh", "energy_today_wh"]] = np.nan
       logging.info("Monitoring summary computation completed successfully.")
       logging.info(f"Summary DataFrame shape: {summary_df.shape}")
       return summary_df
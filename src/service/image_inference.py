@@ -11,14 +11,14 @@ from typing import List, Dict, Any
 from PIL import Image
 from tensorflow.keras.models import load_model
 
+from src.config import get_config
 from src.logging.logging import logging
 from src.exception.exception import CustomException
 
 # Load model and configuration
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-IMAGE_MODEL_DIR = os.path.join(f"{BASE_DIR}/notebooks", "models", "image", "latest")
-MODEL_PATH = os.path.join(IMAGE_MODEL_DIR, "model.keras")
-CONFIG_PATH = os.path.join(IMAGE_MODEL_DIR, "config.json")
+IMAGE_MODEL_DIR = get_config().image_model_dir
+MODEL_PATH = IMAGE_MODEL_DIR / "model.keras"
+CONFIG_PATH = IMAGE_MODEL_DIR / "config.json"
 
 # Check if model and config path exists
 if not os.path.exists(MODEL_PATH):
@@ -60,7 +60,7 @@ _UI_BUCKET_MAP = {
 }
 
 # Load model
-_model = load_model(MODEL_PATH, compile=False)
+_model = load_model(str(MODEL_PATH), compile=False)
 
 # Preprocess image
 def preprocess_image(image: Image.Image) -> np.ndarray:
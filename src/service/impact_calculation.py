@@ -5,13 +5,14 @@ of various operations based on input data.
 '''
 
 from dataclasses import dataclass
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 
 from src.logging.logging import logging
 from src.exception.exception import CustomException
 from src.api.model.impact_model import EwasteImpact
 from src.service.carbon_equivalent_calculation import carbon_to_car_km
 
+import numpy as np
 import pandas as pd
 import os
 import sys
@@ -42,54 +43,56 @@ def compute_ewaste_impact(
   - EwasteImpact object containing calculated impact metrics.
   '''
   try:
-    # Check if scenario is valid
-    if scenario not in SCENARIOS:
-      raise ValueError(f"Invalid scenario: {scenario}. Choose from {list(SCENARIOS.keys())}")
-    
-    # Define alpha and r based on scenario
-    alpha = SCENARIOS[scenario]["alpha"]
+    # Single-scenario case of the batch computation, so both share one formula
+    return compute_ewaste_impact_batch(action=action, scenarios=(scenario,), phone_mass_kg=phone_mass_kg)[scenario]
+  except Exception as e:
+    logging.error(f"Error in compute_ewaste_impact: {e}")
+    raise CustomException(e, sys)
+
+# Create function to compute ewaste impact for several scenarios at once
+def compute_ewaste_impact_batch(
+  action: str,
+  scenarios: Tuple[str, ...] = ("conservative", "optimistic"),
+  phone_mass_kg: float = MASS_PHONE_KG) -> Dict[str, EwasteImpact]:
+  '''
+  Function to compute e-waste impact for several scenarios in one vectorized pass.\n
+  params:
+  - action: Recommended action.\n
+  - scenarios: Scenario names to compute (default: conservative and optimistic).\n
+  returns:
+  - Dictionary of scenario name to EwasteImpact object.
+  '''
+  try:
+    # Check if scenarios are valid
+    invalid = [scen for scen in scenarios if scen not in SCENARIOS]
+    if invalid:
+      raise ValueError(f"Invalid scenario: {invalid}. Choose from {list(SCENARIOS.keys())}")
     
-    # Case for reuse action
-    if action == "replace_phone":
-      ewaste_baseline = phone_mass_kg
-      ewaste_with_system = phone_mass_kg
+    # Evaluate all scenarios as arrays over alpha
+    alpha = np.array([SCENARIOS[scen]["alpha"] for scen in scenarios], dtype=np.float64)
+    ewaste_baseline = np.full_like(alpha, phone_mass_kg)
     if action == "replace_battery":
-      # Case for battery replacement
-      ewaste_baseline = phone_mass_kg
       ewaste_with_system = (1 - alpha) * phone_mass_kg + alpha * MASS_PHONE_BATTERY_KG
-      ewaste_reduced = ewaste_baseline - ewaste_with_system
-      carbon_saved = ewaste_reduced * CARBON_PER_KG
-      car_km = carbon_to_car_km(carbon_saved_kg=carbon_saved)
-      # Return EwasteImpact object
-      return EwasteImpact(
-        alpha=alpha,
-        ewaste_baseline_kg=ewaste_baseline,
-        ewaste_with_system_kg=ewaste_with_system,
-        ewaste_reduced_kg=ewaste_reduced,
-        carbon_saved_kg=carbon_saved,
-        car_km_equivalent=car_km
-      )
-    if action == "replace_screen":
-      ewaste_baseline = phone_mass_kg
-      ewaste_with_system = MASS_PHONE_SCREEN_KG
+    elif action == "replace_screen":
+      ewaste_with_system = np.full_like(alpha, MASS_PHONE_SCREEN_KG)
     else:
-      ewaste_baseline = phone_mass_kg
       ewaste_with_system = (1 - alpha) * phone_mass_kg
-    
-    # Case for hold/ screen repair / battery repair
     ewaste_reduced = ewaste_baseline - ewaste_with_system
     carbon_saved = ewaste_reduced * CARBON_PER_KG
-    car_km = carbon_to_car_km(carbon_saved_kg=carbon_saved)
+    car_km = [carbon_to_car_km(carbon_saved_kg=float(carbon)) for carbon in carbon_saved]
     
-    # Return EwasteImpact object
-    return EwasteImpact(
-      alpha=alpha,
-      ewaste_baseline_kg=ewaste_baseline,
-      ewaste_with_system_kg=ewaste_with_system,
-      ewaste_reduced_kg=ewaste_reduced,
-      carbon_saved_kg=carbon_saved,
-      car_km_equivalent=car_km
-    )
+    # Return EwasteImpact objects keyed by scenario
+    return {
+      scen: EwasteImpact.model_construct(
+        alpha=float(alpha[i]),
+        ewaste_baseline_kg=float(ewaste_baseline[i]),
+        ewaste_with_system_kg=float(ewaste_with_system[i]),
+        ewaste_reduced_kg=float(ewaste_reduced[i]),
+        carbon_saved_kg=float(carbon_saved[i]),
+        car_km_equivalent=car_km[i]
+      )
+      for i, scen in enumerate(scenarios)
+    }
   except Exception as e:
-    logging.error("Error in compute_ewaste_impact", e)
+    logging.error(f"Error in compute_ewaste_impact_batch: {e}")
     raise CustomException(e, sys)
\ No newline at end of file
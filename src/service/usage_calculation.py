@@ -72,9 +72,8 @@ class UsageCalculation:
       thr_df = thr_df.dropna(subset=["fg_pkg"])
       
       # Prepare delta bytes and duration
-      thr_df["delta_t"] = thr_df["delta_t"].clip(lower=0).fillna(0)
-      thr_df["delta_tx_bytes"] = thr_df["delta_tx_bytes"].clip(lower=0).fillna(0)
-      thr_df["delta_rx_bytes"] = thr_df["delta_rx_bytes"].clip(lower=0).fillna(0)
+      delta_cols = ["delta_t", "delta_tx_bytes", "delta_rx_bytes"]
+      thr_df.loc[:, delta_cols] = thr_df.loc[:, delta_cols].clip(lower=0).fillna(0)
       thr_df["delta_total_bytes"] = thr_df["delta_tx_bytes"] + thr_df["delta_rx_bytes"]
       
       # Group by device + app
@@ -0,0 +1,89 @@
+'''
+One-shot build step to bundle the SoH model, scaler statistics and config
+into a single joblib artifact loaded at worker start, and to persist the
+fitted foreground app one-hot encoder. Re-run after replacing the model files;
+the prediction controller ignores a bundle built from other sources.
+Usage: python -m src.tools.bundle_model
+'''
+
+import os
+import sys
+import json
+import pickle
+import joblib
+
+import numpy as np
+
+from tensorflow.keras.models import load_model
+from sklearn.preprocessing import OneHotEncoder
+from dotenv import load_dotenv
+
+from src.logging.logging import logging
+from src.exception.exception import CustomException
+from src.tools.fingerprint import source_fingerprint
+
+load_dotenv()
+
+# Define function to build the model bundle
+def build_bundle(model_dir: str) -> str:
+  '''
+  Function to write bundle.joblib next to the latest model files.\n
+  params:
+  - model_dir: Directory containing the "latest" model folder.\n
+  returns:
+  - Path of the written bundle.
+  '''
+  try:
+    latest_dir = os.path.join(model_dir, "latest")
+    model = load_model(os.path.join(latest_dir, "model.keras"), compile=False)
+    with open(os.path.join(latest_dir, "scaler.pkl"), "rb") as file:
+      scaler = pickle.load(file=file)
+    with open(os.path.join(latest_dir, "config.json"), "r") as file:
+      model_config = json.load(file)
+    
+    # Store weights as plain arrays, tagged with the fingerprint of the source files
+    bundle = {
+      "source_hash": source_fingerprint(latest_dir),
+      "arch": model.to_json(),
+      "weights": model.get_weights(),
+      "scaler_mean": scaler.mean_,
+      "scaler_scale": scaler.scale_,
+      "config": model_config,
+    }
+    bundle_path = os.path.join(latest_dir, "bundle.joblib")
+    joblib.dump(bundle, bundle_path)
+    logging.info(f"Model bundle written to {bundle_path}")
+    return bundle_path
+  except Exception as e:
+    raise CustomException(e, sys)
+
+# Define function to build the foreground app encoder
+def build_encoder(model_dir: str) -> str:
+  '''
+  Function to write ohe.pkl with the app categories taken from the model config.\n
+  params:
+  - model_dir: Directory containing the "latest" model folder.\n
+  returns:
+  - Path of the written encoder.
+  '''
+  try:
+    latest_dir = os.path.join(model_dir, "latest")
+    with open(os.path.join(latest_dir, "config.json"), "r") as file:
+      model_config = json.load(file)
+    
+    # Categories follow the order of the app_ columns in feature_cols
+    app_categories = [c[4:] for c in model_config["feature_cols"] if c.startswith("app_")]
+    ohe = OneHotEncoder(categories=[app_categories], handle_unknown="ignore", sparse_output=False, dtype=np.float32)
+    ohe.fit(np.array(app_categories, dtype=object).reshape(-1, 1))
+    
+    ohe_path = os.path.join(latest_dir, "ohe.pkl")
+    with open(ohe_path, "wb") as file:
+      pickle.dump(ohe, file=file)
+    logging.info(f"App encoder written to {ohe_path}")
+    return ohe_path
+  except Exception as e:
+    raise CustomException(e, sys)
+
+if __name__ == "__main__":
+  print(build_bundle(os.getenv("MODEL_DIR")))
+  print(build_encoder(os.getenv("MODEL_DIR")))
\ No newline at end of file
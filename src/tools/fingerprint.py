@@ -0,0 +1,29 @@
+'''
+Content fingerprint of the source model files, stored in derived build
+artifacts (bundle.joblib, model_fp16.tflite) so stale artifacts can be detected.
+'''
+
+import os
+import hashlib
+
+# Source files every derived artifact is built from
+SOURCE_FILES = ("model.keras", "scaler.pkl", "config.json")
+
+# Define function to fingerprint the source model files
+def source_fingerprint(latest_dir: str | os.PathLike) -> str | None:
+  '''
+  Function to hash the source model files of a model folder.\n
+  params:
+  - latest_dir: Folder containing model.keras, scaler.pkl and config.json.\n
+  returns:
+  - Hex digest of the files, or None if any of them is missing.
+  '''
+  digest = hashlib.blake2b(digest_size=16)
+  for name in SOURCE_FILES:
+    path = os.path.join(latest_dir, name)
+    if not os.path.exists(path):
+      return None
+    with open(path, "rb") as file:
+      for block in iter(lambda: file.read(1 << 20), b""):
+        digest.update(block)
+  return digest.hexdigest()
\ No newline at end of file
@@ -0,0 +1,70 @@
+'''
+One-shot build step to convert the SoH model (with the scaler folded in)
+into an FP16 TFLite model for CPU inference. Re-run after replacing the model
+files; the prediction controller ignores a TFLite model built from other sources.
+Usage: python -m src.tools.quantize_model
+'''
+
+import os
+import sys
+import json
+import pickle
+import tensorflow as tf
+
+from tensorflow.keras.models import load_model
+from dotenv import load_dotenv
+
+from src.logging.logging import logging
+from src.exception.exception import CustomException
+from src.tools.fingerprint import source_fingerprint
+
+load_dotenv()
+
+# Define function to build the FP16 TFLite model
+def build_fp16_tflite(model_dir: str) -> str:
+  '''
+  Function to write model_fp16.tflite next to the latest model files.\n
+  params:
+  - model_dir: Directory containing the "latest" model folder.\n
+  returns:
+  - Path of the written TFLite model.
+  '''
+  try:
+    latest_dir = os.path.join(model_dir, "latest")
+    model = load_model(os.path.join(latest_dir, "model.keras"), compile=False)
+    with open(os.path.join(latest_dir, "scaler.pkl"), "rb") as file:
+      scaler = pickle.load(file=file)
+    with open(os.path.join(latest_dir, "config.json"), "r") as file:
+      model_config = json.load(file)
+    
+    # Fold the scaler into the graph, same as the prediction controller
+    fused_model = tf.keras.Sequential([
+      tf.keras.Input(shape=(model_config["window_size"], len(model_config["feature_cols"]))),
+      tf.keras.layers.Normalization(axis=-1, mean=scaler.mean_, variance=scaler.scale_ ** 2),
+      model
+    ])
+    
+    # Convert with FP16 weights, falling back to TF ops for LSTM kernels
+    converter = tf.lite.TFLiteConverter.from_keras_model(fused_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    converter.target_spec.supported_types = [tf.float16]
+    converter.target_spec.supported_ops = [
+      tf.lite.OpsSet.TFLITE_BUILTINS,
+      tf.lite.OpsSet.SELECT_TF_OPS,
+    ]
+    tflite_model = converter.convert()
+    
+    tflite_path = os.path.join(latest_dir, "model_fp16.tflite")
+    with open(tflite_path, "wb") as file:
+      file.write(tflite_model)
+    
+    # Record the source fingerprint next to the model
+    with open(os.path.join(latest_dir, "model_fp16.hash"), "w") as file:
+      file.write(source_fingerprint(latest_dir))
+    logging.info(f"FP16 TFLite model written to {tflite_path}")
+    return tflite_path
+  except Exception as e:
+    raise CustomException(e, sys)
+
+if __name__ == "__main__":
+  print(build_fp16_tflite(os.getenv("MODEL_DIR")))
\ No newline at end of file
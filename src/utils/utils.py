@@ -137,14 +137,11 @@ def calculate_soh_and_cycles(
     
     df["Ct_mAh"] = np.nan
     if df["full_block_id"].notna().any():
-      grp = df.dropna(subset=["full_block_id", "Q_mAh"])
-      for bid, g in grp.groupby("full_block_id"):
-        q = g["Q_mAh"].dropna()
-        if q.empty:
-          continue
-        ct = np.nanpercentile(q, 95)
-        idx = q.idxmax()
-        df.loc[idx, "Ct_mAh"] = ct
+      # 95th percentile of each full block, placed at the block's max Q_mAh row
+      grp = df.dropna(subset=["full_block_id", "Q_mAh"]).groupby("full_block_id")["Q_mAh"]
+      block_ct = grp.quantile(0.95)
+      block_idx = grp.idxmax()
+      df.loc[block_idx.to_numpy(), "Ct_mAh"] = block_ct.loc[block_idx.index].to_numpy()
     
     if df["Ct_mAh"].isna().all():
       df["Ct_mAh"] = (
@@ -286,37 +283,35 @@ def plot_device_degradation_with_merge(res_df, df_all, device_id, outdir="export
 # Define function to add aging features
 def add_aging_features(df, win_fast=6, win_slow=48):
   df = df.copy()
-  df = df.sort_values(["device_id", "created_at"])
+  df = df.sort_values(["device_id", "created_at"], kind="mergesort")
   df["SoH_filled"] = df["SoH_filled"].ffill().bfill()
   
-  def _per_dev(g):
-    g = g.sort_values("created_at").copy()
-    # EMA SoH
-    g["soh_ema_fast"] = g["SoH_filled"].ewm(span=win_fast, adjust=False).mean()
-    g["soh_ema_slow"] = g["SoH_filled"].ewm(span=win_slow, adjust=False).mean()
-    
-    # trend (positif = naik, negatif = turun)
-    g["soh_trend"] = g["soh_ema_fast"] - g["soh_ema_slow"]
-    
-    # delta EFC
-    g["efc_delta"] = g["EFC"].diff().fillna(0.0)
-    
-    # temperature features
-    if "batt_temp_c" in g.columns:
-      g["temp_ema"] = g["batt_temp_c"].ewm(span=win_fast, adjust=False).mean()
-      g["temp_max_win"] = g["batt_temp_c"].rolling(win_fast, min_periods=1).max()
-    else:
-      g["temp_ema"] = 0.0
-      g["temp_max_win"] = 0.0
-    # throughput features
-    if "throughput_total_gb" in g.columns:
-      g["tp_ema"] = g["throughput_total_gb"].ewm(span=win_fast, adjust=False).mean()
-    else:
-      g["tp_ema"] = 0.0
-    if "energy_per_bit_avg_J" in g.columns:
-      g["epb_ema"] = g["energy_per_bit_avg_J"].ewm(span=win_fast, adjust=False).mean()
-    else:
-      g["epb_ema"] = 0.0
-    return g
-  df = df.groupby("device_id").apply(_per_dev).reset_index(drop=True)
+  # group once; rows are already in (device, time) order
+  df = df.dropna(subset=["device_id"]).reset_index(drop=True)
+  gb = df.groupby("device_id", sort=False, group_keys=False)
+  
+  # fast EMAs share one span, so compute them in a single grouped ewm pass
+  fast_cols = [c for c in ("SoH_filled", "batt_temp_c", "throughput_total_gb", "energy_per_bit_avg_J") if c in df.columns]
+  ema_fast = gb[fast_cols].ewm(span=win_fast, adjust=False).mean().reset_index(level=0, drop=True)
+  
+  # EMA SoH
+  df["soh_ema_fast"] = ema_fast["SoH_filled"]
+  df["soh_ema_slow"] = gb["SoH_filled"].ewm(span=win_slow, adjust=False).mean().reset_index(level=0, drop=True)
+  
+  # trend (positif = naik, negatif = turun)
+  df["soh_trend"] = df["soh_ema_fast"] - df["soh_ema_slow"]
+  
+  # delta EFC
+  df["efc_delta"] = gb["EFC"].diff().fillna(0.0)
+  
+  # temperature features
+  if "batt_temp_c" in df.columns:
+    df["temp_ema"] = ema_fast["batt_temp_c"]
+    df["temp_max_win"] = gb["batt_temp_c"].rolling(win_fast, min_periods=1).max().reset_index(level=0, drop=True)
+  else:
+    df["temp_ema"] = 0.0
+    df["temp_max_win"] = 0.0
+  # throughput features
+  df["tp_ema"] = ema_fast["throughput_total_gb"] if "throughput_total_gb" in df.columns else 0.0
+  df["epb_ema"] = ema_fast["energy_per_bit_avg_J"] if "energy_per_bit_avg_J" in df.columns else 0.0
   return df
\ No newline at end of file